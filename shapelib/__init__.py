@@ -4,6 +4,14 @@ from __future__ import absolute_import
 
 from .core import *
 from .matplot import *
-from .raster import rasterize
+from .raster import (
+    rasterize, rasterize_tiled, rasterize_parallel, rasterize_many,
+    rasterize_coverage, Rasterizer, distance_field, rasterize_pyramid,
+    iter_rasterize, RasterCache
+)
+from .mask import PackedMask, RLEMask
 
 
+from .prepared import PreparedShape
+from .scene import Scene
+from .geometryarray import GeometryArray
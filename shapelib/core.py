@@ -8,14 +8,17 @@ import math
 from math import pi, sqrt
 from numbers import Number as _Number
 import array
+import weakref
+from collections import namedtuple, OrderedDict
+
+import numpy as np
 
 from shapely.geometry import (
     LineString, Polygon, Point, box, asPoint,
-    asPolygon, MultiPoint, MultiLineString
+    asPolygon, MultiPoint, MultiLineString, MultiPolygon, GeometryCollection
 )
 from shapely.geometry.polygon import LinearRing
-from shapely.affinity import rotate
-from shapely.topology import TopologicalError as _TopologicalError
+from shapely.affinity import rotate, translate
 from . import util
 from six.moves import map
 
@@ -31,17 +34,132 @@ def _normalize_point(p):
                 return p
             else:
                 raise TypeError("each point must be a tuple (x, y) of float")
+    elif isinstance(p, np.ndarray) and p.ndim == 1:
+        return tuple(p)
     elif hasattr(p, "x") and hasattr(p, "y"):
         return (p.x, p.y)
     else:
         raise TypeError("point not understood")
 
+def _as_coords(obj):
+    """
+    if `obj` is a numpy array or supports the buffer protocol, return it
+    as a float64 array of shape (N, 2) or (N, 3) (without copying if
+    possible), otherwise None. 1D arrays are interpreted as x0, y0, x1, y1, ...
+    """
+    if not isinstance(obj, np.ndarray):
+        if isinstance(obj, (tuple, list, str)):
+            return None
+        try:
+            memoryview(obj)
+        except TypeError:
+            return None
+    coords = np.asarray(obj, dtype=np.float64)
+    if coords.ndim == 1:
+        if len(coords) % 2:
+            raise ValueError("a flat array of coordinates should have an even length")
+        return util.window(coords, 2, 2)
+    if coords.ndim != 2 or coords.shape[1] not in (2, 3):
+        raise ValueError("expected an array of shape (N, 2) or (N, 3), got {0}".format(
+            coords.shape))
+    return coords
+
 def _normalize_points(points):
+    coords = _as_coords(points)
+    if coords is None and len(points) == 1:
+        coords = _as_coords(points[0])
+    if coords is not None:
+        return coords
     if all(isinstance(p, _Number) for p in points):
-        points = util.window(points, 2, 2)
+        return util.window(np.asarray(points, dtype=np.float64), 2, 2)
     coords = list(map(_normalize_point, points))
     return coords
 
+###############################################
+#
+# Shape templates
+#
+################################################
+
+_templatestats = namedtuple("templatestats", "hits misses size maxsize")
+
+
+class TemplateCache(object):
+    """
+    A LRU cache of shape templates, keyed by the parameters defining
+    a shape (for example the radius and resolution of a circle).
+
+    A template holds the coordinates of a shape placed at the origin.
+    Shapes which repeat at many positions (circle, ring, line, tube)
+    are created by translating their template, instead of buffering
+    from scratch each time. At most `maxsize` templates are kept;
+    a maxsize of 0 disables the cache
+
+    Example
+    =======
+
+    >>> template_cache.clear()
+    >>> c1, c2 = circle(0, 0, 1), circle(5, 5, 1)
+    >>> template_cache.stats
+    templatestats(hits=1, misses=1, size=1, maxsize=1024)
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._templates = OrderedDict()
+
+    def get(self, key, factory):
+        """
+        the template for `key`. If not present, it is created by calling
+        factory() and stored, evicting the least recently used template
+        if the cache is full
+        """
+        try:
+            template = self._templates.pop(key)
+        except KeyError:
+            self.misses += 1
+            template = factory()
+            if self.maxsize <= 0:
+                return template
+            while len(self._templates) >= self.maxsize:
+                self._templates.popitem(last=False)
+        else:
+            self.hits += 1
+        self._templates[key] = template
+        return template
+
+    def clear(self):
+        """
+        remove all templates and reset the counters
+        """
+        self._templates.clear()
+        self.hits = self.misses = 0
+
+    @property
+    def stats(self):
+        """
+        namedtup(hits, misses, size, maxsize)
+        """
+        return _templatestats(self.hits, self.misses, len(self._templates), self.maxsize)
+
+
+template_cache = TemplateCache()
+
+
+def _circle_template(radius, resolution):
+    """
+    the vertices of a circle around the origin (without the closing
+    vertex), as an array of shape (4*resolution, 2)
+    """
+    def factory():
+        zero = np.zeros(1)
+        coords = _arcs(zero, zero, np.array([radius]), zero, resolution)[0, :-1]
+        coords.flags.writeable = False
+        return coords
+    return template_cache.get(('circle', float(radius), resolution), factory)
+
+
 ###############################################
 #
 # Helpers to create shapely geometries
@@ -61,6 +179,11 @@ def linestr(*points):
     >>> [coord for coord in l.coords]
     [(0.0, 0.0), (1.0, 1.0), (2.0, -1.0)]
 
+    The points can also be given as a flat sequence of numbers, or as
+    an array of shape (N, 2) or (2N,), which is passed to shapely as is
+
+    >>> linestr(np.array([[0, 0], [1, 1]])).length
+    1.4142135623730951
     """
     coords = _normalize_points(points)
     return LineString(coords)
@@ -77,27 +200,58 @@ def rect_line(x0, y0, x1, y1):
     """
     return LinearRing([(x0, y0), (x1, y0), (x1, y1), (x0, y1)])
 
-def circle(centerx, centery, radius):
-    return Point(centerx, centery).buffer(radius)
+def circle(centerx, centery, radius, resolution=16):
+    """
+    a circular polygon. The vertices are translated from a cached
+    template (see TemplateCache)
+
+    resolution: the number of segments per quarter circle (as in buffer)
+
+    As with buffer, a circle with a radius <= 0 is an empty Polygon
+    """
+    if radius <= 0:
+        return Polygon()
+    return Polygon(_circle_template(radius, resolution) + (centerx, centery))
 
 def line_at_x(line, x):
     _, y0, _, y1 = line.bounds
     linex = LineString([(x, y0), (x, y1)])
     return line.intersection(linex)
 
-def ring(centerx, centery, radius, width):
+def ring(centerx, centery, radius, width, resolution=16):
     """
-    a circular ring
+    a circular ring. The vertices are translated from cached templates
+    (see TemplateCache). A ring which is wider than its radius is a
+    filled circle, a ring with a radius or a width <= 0 is an empty Polygon
     """
-    c_out = Point(centerx, centery).buffer(radius)
-    c_in = Point(centerx, centery).buffer(radius - width)
-    return c_out.difference(c_in)
+    if radius <= 0 or width <= 0:
+        return Polygon()
+    center = (centerx, centery)
+    outer = _circle_template(radius, resolution) + center
+    if width >= radius:
+        return Polygon(outer)
+    # the hole runs counterclockwise
+    inner = _circle_template(radius - width, resolution)[::-1] + center
+    return Polygon(outer, [inner])
 
-def line(x0, y0, x1, y1, width=None):
-    l = LineString([(x0, y0), (x1, y1)])
-    if width is not None:
-        l = l.buffer(width)
-    return l
+def line(x0, y0, x1, y1, width=None, resolution=16):
+    """
+    a line segment from (x0, y0) to (x1, y1). If width is given, the
+    line is buffered by width (with round caps), resulting in a Polygon
+    translated from a cached template (see TemplateCache)
+    """
+    if width is None:
+        return LineString([(x0, y0), (x1, y1)])
+    dx, dy = float(x1 - x0), float(y1 - y0)
+
+    def factory():
+        zero = np.zeros(1)
+        poly = lines(zero, zero, dx, dy, width, resolution).geoms[0]
+        coords = np.array(poly.exterior.coords)
+        coords.flags.writeable = False
+        return coords
+    coords = template_cache.get(('line', dx, dy, float(width), resolution), factory)
+    return Polygon(coords + (x0, y0))
 
 def linering(*points):
     """
@@ -114,6 +268,153 @@ def linering(*points):
     coords = _normalize_points(points)
     return LinearRing(coords)
 
+###############################################
+#
+# Vectorized constructors
+#
+################################################
+
+def _broadcast(*params):
+    """
+    broadcast the given scalars/arrays to 1D float arrays of equal length
+    """
+    arrays = np.broadcast_arrays(*[np.atleast_1d(np.asarray(p, dtype=np.float64))
+                                   for p in params])
+    if arrays[0].ndim != 1:
+        raise ValueError("parameters should be scalars or 1D arrays")
+    return arrays
+
+def _arcs(cx, cy, radius, angle0, resolution, turns=1.):
+    """
+    arcs of `radius` around (cx, cy), clockwise from angle0 (radians,
+    counterclockwise from the x axis), each spanning `turns` of a full
+    circle with 4*resolution*turns segments
+
+    Returns an array of shape (N, 4*resolution*turns+1, 2)
+    """
+    numsegs = int(round(4 * resolution * turns))
+    t = angle0[:, None] - np.arange(numsegs + 1) * (2 * pi / (4 * resolution))
+    out = np.empty((len(cx), numsegs + 1, 2))
+    out[:, :, 0] = cx[:, None] + radius[:, None] * np.cos(t)
+    out[:, :, 1] = cy[:, None] + radius[:, None] * np.sin(t)
+    return out
+
+def _collection(geoms):
+    return GeometryCollection(list(geoms))
+
+def circles(centerx, centery, radius, resolution=16):
+    """
+    vectorized version of circle: create many circles at once
+
+    centerx, centery, radius: scalars or arrays of the same length
+    resolution: the number of segments per quarter circle (as in buffer)
+
+    Returns
+    =======
+
+    a GeometryCollection of Polygons, which can be unioned or rasterized
+    as one geometry. The vertices are computed directly, one template
+    per distinct radius, and are the same as those of circle. Circles
+    with a radius <= 0 are empty Polygons
+
+    Example
+    =======
+
+    >>> cs = circles([0, 10], 0, [1, 2])
+    >>> len(cs.geoms)
+    2
+    >>> cs.geoms[1].equals(circle(10, 0, 2))
+    True
+    """
+    cx, cy, radius = _broadcast(centerx, centery, radius)
+    coords = _instances(radius, resolution, cx, cy)
+    return _collection(Polygon(c) if r > 0 else Polygon()
+                       for c, r in zip(coords, radius))
+
+def _instances(radius, resolution, cx, cy, reverse=False):
+    """
+    the vertices of circles of the given radii around (cx, cy), as
+    an array of shape (N, 4*resolution, 2). Circles are translated
+    from one template per distinct radius
+    """
+    radii, inverse = np.unique(radius, return_inverse=True)
+    templates = np.stack([_circle_template(r, resolution) for r in radii])
+    if reverse:
+        templates = templates[:, ::-1]
+    coords = templates[inverse]
+    coords[:, :, 0] += cx[:, None]
+    coords[:, :, 1] += cy[:, None]
+    return coords
+
+def rings(centerx, centery, radius, width, resolution=16):
+    """
+    vectorized version of ring: create many circular rings at once,
+    without any boolean operation
+
+    centerx, centery, radius, width: scalars or arrays of the same length
+    resolution: the number of segments per quarter circle (as in buffer)
+
+    Returns
+    =======
+
+    a GeometryCollection of Polygons. A ring which is wider than its
+    radius is a filled circle, a ring with a radius or a width <= 0 is
+    an empty Polygon
+    """
+    cx, cy, radius, width = _broadcast(centerx, centery, radius, width)
+    empty = (radius <= 0) | (width <= 0)
+    solid = width >= radius
+    outer = _instances(radius, resolution, cx, cy)
+    # the holes run counterclockwise
+    inner = _instances(np.where(solid, radius, radius - width), resolution, cx, cy,
+                       reverse=True)
+    return _collection(Polygon() if e else Polygon(o) if s else Polygon(o, [i])
+                       for o, i, s, e in zip(outer, inner, solid, empty))
+
+def lines(x0, y0, x1, y1, width=None, resolution=16):
+    """
+    vectorized version of line: create many line segments at once
+
+    x0, y0, x1, y1: scalars or arrays of the same length
+    width: if given, each line is buffered by width (with round caps),
+           resulting in Polygons
+    resolution: the number of segments per quarter circle of the caps
+
+    Returns
+    =======
+
+    a GeometryCollection of LineStrings, or of Polygons if width is given
+    """
+    x0, y0, x1, y1 = _broadcast(x0, y0, x1, y1)
+    if width is None:
+        coords = np.stack([x0, y0, x1, y1], axis=1).reshape(-1, 2, 2)
+        return _collection(LineString(c) for c in coords)
+    width = _broadcast(width, x0)[0]
+    # direction of each line, the caps start at its left side
+    a = np.arctan2(y1 - y0, x1 - x0) + pi/2
+    end = _arcs(x1, y1, width, a, resolution, 0.5)
+    begin = _arcs(x0, y0, width, a + pi, resolution, 0.5)
+    coords = np.concatenate([end, begin], axis=1)
+    return _collection(Polygon(c) for c in coords)
+
+def _rect_coords(x0, y0, x1, y1):
+    x0, y0, x1, y1 = _broadcast(x0, y0, x1, y1)
+    return np.stack([x0, y0, x1, y0, x1, y1, x0, y1], axis=1).reshape(-1, 4, 2)
+
+def rect_polys(x0, y0, x1, y1):
+    """
+    vectorized version of rect_poly: a GeometryCollection of rectangular
+    Polygons. The parameters are scalars or arrays of the same length
+    """
+    return _collection(Polygon(c) for c in _rect_coords(x0, y0, x1, y1))
+
+def rect_lines(x0, y0, x1, y1):
+    """
+    vectorized version of rect_line: a GeometryCollection of rectangular
+    LinearRings. The parameters are scalars or arrays of the same length
+    """
+    return _collection(LinearRing(c) for c in _rect_coords(x0, y0, x1, y1))
+
 
 def line_extrapolate_point(l, p, length):
     """
@@ -124,37 +425,101 @@ def line_extrapolate_point(l, p, length):
     p: a point within that line
     length: the length that a line from p to p2 would have
 
+    p2 lies in the direction of the first segment of the line (backwards)
+    if p is nearer to its beginning, or of its last segment otherwise
     """
     p = Point(*_normalize_point(p))
-    a = line_angle_at(l, p)
-    if a > pi:
-        a = a % pi
-    p2 = Point(p.x, p.y + length)
-    c = l.centroid
-    if p.x < c.x:
-        if p.y < c.y:
-            angle = pi-a
-        else:
-            angle = a
-    elif p.x > c.x:
-        if p.y < c.y:
-            angle = -a
-        else:
-            angle = -a
-    else:
-        if p.y < c.y:
-            angle = a + pi
-        elif p.y > c.y:
-            angle = a % pi
-        else:
-            angle = 100
-    p3 = rotate(p2, math.degrees(angle), origin=p)
-    return p3
+    if hasattr(l, 'geoms'):
+        l = _nearest_part(l, p)
+    l = _exterior(l)
+    backward, forward = _end_directions(np.asarray(l.coords))
+    dx, dy = backward if l.project(p) < l.length * 0.5 else forward
+    return Point(p.x + length * dx, p.y + length * dy)
+
+def _end_directions(coords):
+    """
+    the unit vectors of the first segment, pointing away from the line,
+    and of the last segment of the polyline `coords`. Repeated points are
+    skipped. A line without extent has no direction (the vectors are 0)
+    """
+    coords = coords[:, :2]
+    distinct = np.flatnonzero(np.any(coords != coords[0], axis=1))
+    if len(distinct) == 0:
+        return np.zeros(2), np.zeros(2)
+    backward = coords[0] - coords[distinct[0]]
+    distinct = np.flatnonzero(np.any(coords != coords[-1], axis=1))
+    forward = coords[-1] - coords[distinct[-1]]
+    return backward / math.hypot(*backward), forward / math.hypot(*forward)
 
 def line_extend(l, p, distance):
+    """
+    extend the line `l` by `distance` at the extreme `p`
+
+    l: a linestring
+    p: the extreme of the line to extend (its first or last point)
+    distance: the length to add
+
+    Returns
+    =======
+
+    a LineString, with a point prepended (if p is nearer to the beginning
+    of l) or appended in the direction of the segment at that extreme
+    """
+    p = Point(*_normalize_point(p))
+    coords = np.asarray(l.coords)
     p2 = line_extrapolate_point(l, p, distance)
-    l2 = linestr(p, p2)
-    return l.union(l2)
+    if l.project(p) < l.length * 0.5:
+        return LineString(np.concatenate([p2.coords, coords[:, :2]]))
+    return LineString(np.concatenate([coords[:, :2], p2.coords]))
+
+def lines_extend(lines, distance, begin=True, end=True):
+    """
+    vectorized version of line_extend: extend many lines at once,
+    at their beginning, their end or both
+
+    lines: a sequence of linestrings (or of arrays of shape (N, 2))
+    distance: the length to add at each extreme, a scalar or an array
+              with one value per line
+    begin, end: which extremes to extend
+
+    Returns
+    =======
+
+    a list of LineStrings
+
+    Example
+    =======
+
+    >>> ls = lines_extend([linestr(0, 0, 1, 0), linestr(0, 0, 0, 2)], [1, 0.5])
+    >>> [l.coords[:] for l in ls]
+    [[(-1.0, 0.0), (0.0, 0.0), (1.0, 0.0), (2.0, 0.0)], [(0.0, -0.5), (0.0, 0.0), (0.0, 2.0), (0.0, 2.5)]]
+    """
+    allcoords = [np.asarray(l.coords if hasattr(l, 'coords') else l, dtype=np.float64)[:, :2]
+                 for l in lines]
+    if not allcoords:
+        return []
+    heads = np.array([coords[:2] for coords in allcoords])
+    tails = np.array([coords[-2:] for coords in allcoords])
+    backward = heads[:, 0] - heads[:, 1]
+    forward = tails[:, 1] - tails[:, 0]
+    # lines beginning or ending with a repeated point are the exception
+    repeated = np.flatnonzero(np.all(backward == 0, axis=1) | np.all(forward == 0, axis=1))
+    for i in repeated:
+        backward[i], forward[i] = _end_directions(allcoords[i])
+    backward /= np.maximum(np.hypot(backward[:, 0], backward[:, 1]), 1e-300)[:, None]
+    forward /= np.maximum(np.hypot(forward[:, 0], forward[:, 1]), 1e-300)[:, None]
+    distance = np.broadcast_to(np.asarray(distance, dtype=np.float64), (len(allcoords),))
+    heads = heads[:, 0] + backward * distance[:, None]
+    tails = tails[:, 1] + forward * distance[:, None]
+    out = []
+    for coords, head, tail in zip(allcoords, heads, tails):
+        parts = [coords]
+        if begin:
+            parts.insert(0, head[None])
+        if end:
+            parts.append(tail[None])
+        out.append(LineString(np.concatenate(parts)))
+    return out
 
 def test_line_extrpolate_point():
     f = line_extrapolate_point
@@ -173,9 +538,44 @@ def tube(points, diam, wallwidth=0.05, begin='closed', end='flat'):
 
     A tube is a set of two parallel lines, where the edges are either
     closed (curved), open, or flat
+
+    Tubes are cached as templates (see TemplateCache), keyed by the
+    shape of the path relative to its first point, so that the same
+    tube placed at another position is only translated
     """
-    l = linestr(*points)
-    return linestr_to_tube(l, diam=diam, wallwidth=wallwidth, begin=begin, end=end)
+    coords = np.array(_normalize_points(points), dtype=np.float64)[:, :2]
+    x0, y0 = coords[0]
+    coords -= (x0, y0)
+
+    def factory():
+        return linestr_to_tube(LineString(coords), diam=diam, wallwidth=wallwidth,
+                               begin=begin, end=end)
+    key = ('tube', coords.tobytes(), float(diam), float(wallwidth), begin, end)
+    return translate(template_cache.get(key, factory), x0, y0)
+
+def tubes(paths, diam, wallwidth=0.05, begin='closed', end='flat'):
+    """
+    vectorized version of tube: create many tubes at once
+
+    paths: a sequence of paths, each a sequence of points or an array
+           of shape (N, 2), or a LineString
+    diam, wallwidth: scalars or arrays with one value per path
+    begin, end: one of 'closed', 'flat', 'open' (see linestr_to_tube)
+
+    Returns
+    =======
+
+    a GeometryCollection with one tube per path
+    """
+    paths = [p.coords if hasattr(p, 'coords') else p for p in paths]
+    diams, wallwidths = _broadcast(diam, wallwidth)
+    if len(diams) == 1:
+        diams = np.repeat(diams, len(paths))
+        wallwidths = np.repeat(wallwidths, len(paths))
+    elif len(diams) != len(paths):
+        raise ValueError("diam and wallwidth should have one value per path")
+    return _collection(tube(path, d, w, begin, end)
+                       for path, d, w in zip(paths, diams.tolist(), wallwidths.tolist()))
 
 def linestr_to_tube(l, diam, wallwidth=0.05, begin='closed', end='flat'):
     """
@@ -186,6 +586,142 @@ def linestr_to_tube(l, diam, wallwidth=0.05, begin='closed', end='flat'):
     wallwidth:  width of the wall of the tube
     begin, end: one of 'closed', 'flat', 'open'.
                 Indicates the shape of the extremes.
+
+    The walls are built directly from the offset curves of the line,
+    the extremes are constructed analytically:
+
+    closed: the walls are joined by a half ring around the extreme
+    flat:   the walls are joined by a flat plug extending diam/2+wallwidth
+            beyond the extreme
+    open:   the walls end at the perpendicular through the extreme
+
+    If the offset curves collapse (for example, at bends tighter than the
+    tube), the tube is built by boolean operations on buffers instead
+    """
+    for cap in (begin, end):
+        if cap not in ('closed', 'flat', 'open'):
+            raise ValueError("begin and end should be one of 'closed', 'flat', 'open'")
+    t = _tube_direct(l, diam*0.5, wallwidth, begin, end)
+    if t is None or not t.is_valid:
+        t = _tube_boolean(l, diam, wallwidth, begin, end)
+    return t
+
+def _offset_curves(coords, distances, resolution=16):
+    """
+    the offset curves of the polyline `coords` (without repeated points)
+    at each of `distances` (positive = left), running in the direction
+    of the line. Convex joins are rounded as in buffer, concave joins are
+    mitered.
+
+    Returns a list of arrays of shape (N, 2), where an item is None if a
+    concave join would take more than the length of its segments (the
+    curve would loop)
+    """
+    d = np.diff(coords, axis=0)
+    seglen = np.hypot(d[:, 0], d[:, 1])
+    t = d / seglen[:, None]
+    n = np.stack([-t[:, 1], t[:, 0]], axis=1)
+    if len(d) == 1:
+        return [coords + n[0]*distance for distance in distances]
+    t0, t1, n0, n1 = t[:-1], t[1:], n[:-1], n[1:]
+    cross = t0[:, 0]*t1[:, 1] - t0[:, 1]*t1[:, 0]
+    dot = np.clip(np.einsum('ij,ij->i', t0, t1), -1, 1)
+    straight = np.abs(cross) <= 1e-12
+    # tan(angle/2), for the length of the segments taken by a mitered join
+    halftan = np.abs(cross) / (1 + dot)
+    # rounded joins are subdivided as in buffer: in equal steps close
+    # to a quarter circle / resolution
+    sweep = np.arccos(dot)
+    numsteps = np.maximum((sweep / (pi*0.5/resolution) + 0.5).astype(int), 1)
+    vertices = coords[1:-1]
+    distances = np.asarray(distances, dtype=np.float64)
+    curves = [None] * len(distances)
+    # the joins depend only on the side, the curves at one side
+    # are computed at once
+    for sign in (1, -1):
+        side = np.flatnonzero(np.sign(distances) == sign)
+        if len(side) == 0:
+            continue
+        convex = (cross * sign < 0) | (straight & (dot < 0))
+        consumed = np.where(convex | straight, 0, halftan)
+        taken = np.zeros(len(d))
+        taken[1:] += consumed
+        taken[:-1] += consumed
+        nsegs = np.where(convex, numsteps, 0)
+        counts = nsegs + 1
+        k = np.repeat(np.arange(len(dot)), counts)
+        j = np.arange(len(k)) - np.repeat(np.cumsum(counts) - counts, counts)
+        a0 = np.arctan2(n0[:, 1]*sign, n0[:, 0]*sign)
+        theta = a0[k] - sign * sweep[k] * j / np.maximum(nsegs[k], 1)
+        unitjoins = np.where(convex[k, None],
+                             np.stack([np.cos(theta), np.sin(theta)], axis=1) * sign,
+                             ((n0 + n1) / (1 + np.where(convex, 0, dot))[:, None])[k])
+        for i in side:
+            distance = distances[i]
+            if np.any(taken * abs(distance) > seglen):
+                continue
+            curves[i] = np.concatenate([coords[:1] + n[:1]*distance,
+                                        vertices[k] + unitjoins * distance,
+                                        coords[-1:] + n[-1:]*distance])
+    return curves
+
+def _tube_cap(p, normal, tangent, radius, cap, inner):
+    """
+    the vertices of the cap at the extreme `p`, going from its left
+    side (p + normal*radius) to its right side, both excluded. tangent
+    points away from the tube
+    """
+    if cap == 'closed':
+        a = math.atan2(normal[1], normal[0])
+        one = np.ones(1)
+        return _arcs(one*p[0], one*p[1], one*radius, one*a, 16, 0.5)[0, 1:-1]
+    if cap == 'flat' and not inner:
+        return np.array([p + (normal + tangent) * radius, p + (tangent - normal) * radius])
+    return np.empty((0, 2))
+
+def _tube_direct(l, r, wallwidth, begin, end):
+    """
+    build the tube from the offset curves of `l`, or return None
+    if these are degenerate
+    """
+    coords = np.array(l.coords)[:, :2]
+    if len(coords) > 1:
+        keep = np.concatenate([[True], np.any(np.diff(coords, axis=0) != 0, axis=1)])
+        coords = coords[keep]
+    if len(coords) < 2 or r <= 0 or wallwidth <= 0:
+        return None
+    R = r + wallwidth
+    d0, d1 = coords[1] - coords[0], coords[-1] - coords[-2]
+    t0, t1 = d0 / math.hypot(*d0), d1 / math.hypot(*d1)
+    # the left normals at both extremes
+    n0, n1 = np.array([-t0[1], t0[0]]), np.array([-t1[1], t1[0]])
+    p0, p1 = coords[0], coords[-1]
+    curves = _offset_curves(coords, (R, r, -R, -r))
+    if any(curve is None for curve in curves):
+        return None
+    outleft, inleft, outright, inright = curves
+    # the caps go from the left to the right side, seen from the outside.
+    # At the beginning the left side of the line is on the right
+    outbegin = _tube_cap(p0, -n0, -t0, R, begin, False)
+    inbegin = _tube_cap(p0, -n0, -t0, r, begin, True)
+    outend = _tube_cap(p1, n1, t1, R, end, False)
+    inend = _tube_cap(p1, n1, t1, r, end, True)
+    if begin != 'open' and end != 'open':
+        shell = np.concatenate([outleft, outend, outright[::-1], outbegin])
+        hole = np.concatenate([inleft, inend, inright[::-1], inbegin])
+        return Polygon(shell, [hole])
+    if begin == 'open' and end == 'open':
+        return MultiPolygon([Polygon(np.concatenate([outleft, inleft[::-1]])),
+                             Polygon(np.concatenate([outright, inright[::-1]]))])
+    if begin == 'open':
+        shell = [outleft, outend, outright[::-1], inright, inend[::-1], inleft[::-1]]
+    else:
+        shell = [outright[::-1], outbegin, outleft, inleft[::-1], inbegin[::-1], inright]
+    return Polygon(np.concatenate(shell))
+
+def _tube_boolean(l, diam, wallwidth, begin, end):
+    """
+    build the tube by boolean operations on buffers of `l`
     """
     r = diam * 0.5
     t = l.buffer(r+wallwidth).difference(l.buffer(r))
@@ -223,77 +759,170 @@ def perpendicular_at(line, point, length):
     point: a point within the line at which to search for a perpendicular line
     length: length of the line
     """
-    point = asPoint(point)
-    E = 1e-8
-    if line.intersects(point):
-        refpoint = point
-    else:
-        r = 16
-        while True:
-            refpoint = point.buffer(line.distance(point)+E, resolution=r).exterior.intersection(line)
-            if not refpoint.is_empty:
-                break
-            else:
-                r = r * 2
-        assert not refpoint.is_empty
-    a = line_angle_at(line, refpoint)
-    a2 = a + pi/2
-    p2 = Point(point.x, point.y + length*0.5)
-    p3 = rotate(p2, -math.degrees(a2), origin=point)
-    p4 = rotate(p2, (180 - math.degrees(a2)), origin=point)
-    l = linestr(p3, p4)
-    return l
+    point = Point(*_normalize_point(point))
+    return _perpendicular(point, line_angle_at(line, point), length)
+
+
+def _perpendicular(point, angle, length):
+    """
+    a line of the given length centered at `point`, perpendicular
+    to the direction `angle` (see angle_from_points)
+    """
+    a2 = angle + pi/2
+    dx = math.sin(a2) * length * 0.5
+    dy = math.cos(a2) * length * 0.5
+    return LineString([(point.x + dx, point.y + dy), (point.x - dx, point.y - dy)])
+
+
+_LineIndex = namedtuple("_LineIndex", "coords cumlength units closed")
+_line_indices = {}
+
+
+def _cached_line_index(geom, getline):
+    """
+    the _LineIndex of getline(geom), cached for as long as `geom` is alive
+    """
+    key = (id(geom), getline)
+    entry = _line_indices.get(key)
+    if entry is not None and entry[0]() is geom:
+        return entry[1]
+    index = _line_index(getline(geom))
+    ref = weakref.ref(geom, lambda _, key=key: _line_indices.pop(key, None))
+    _line_indices[key] = (ref, index)
+    return index
+
+
+def _line_index(line):
+    """
+    build the index used to look up the segment at a given distance
+    along `line` (a LineString or a LinearRing): the coordinates without
+    repeated points, the cumulative length at each vertex and the
+    direction of each segment as a unit vector
+    """
+    coords = np.asarray(line.coords)[:, :2]
+    if len(coords) > 1:
+        keep = np.ones(len(coords), dtype=bool)
+        keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+        coords = coords[keep]
+    deltas = np.diff(coords, axis=0)
+    lengths = np.hypot(deltas[:, 0], deltas[:, 1])
+    cumlength = np.concatenate([[0.], np.cumsum(lengths)])
+    units = deltas / lengths[:, None] if len(lengths) else deltas
+    closed = len(coords) > 2 and bool(np.all(coords[0] == coords[-1]))
+    return _LineIndex(coords, cumlength, units, closed)
+
+
+def _tangent_angle(index, distance):
+    """
+    the angle (see angle_from_points) of the tangent at `distance` along
+    the indexed line. See _tangent_angles
+    """
+    return float(_tangent_angles(index, np.array([distance], dtype=float))[0])
+
+
+def _tangent_angles(index, distances):
+    """
+    the angles (see angle_from_points) of the tangents at `distances`
+    along the indexed line (see _tangent_vectors)
+    """
+    v = _tangent_vectors(index, distances)
+    return _angles(v[:, 0], v[:, 1])
+
+
+def _tangent_vectors(index, distances):
+    """
+    the unit vectors of the tangents at `distances` along the indexed
+    line. The segments are found by binary search over the cumulative
+    lengths. At a vertex the tangent is the bisector of the incoming and
+    the outgoing segments. At the extremes of an open line it is the
+    direction of the first/last segment
+    """
+    numsegs = len(index.units)
+    if numsegs == 0:
+        return np.tile([0., 1.], (len(distances), 1))
+    cumlength = index.cumlength
+    k = np.searchsorted(cumlength, distances, side='right') - 1
+    np.clip(k, 0, numsegs - 1, out=k)
+    tolerance = 1e-9 * cumlength[-1]
+    v = index.units[k]
+    atstart = np.abs(distances - cumlength[k]) <= tolerance
+    atend = ~atstart & (np.abs(distances - cumlength[k+1]) <= tolerance)
+    if not index.closed:
+        atstart &= k > 0
+        atend &= k + 1 < numsegs
+    neighbour = np.where(atstart[:, None], index.units[k - 1],
+                         index.units[(k + 1) % numsegs])
+    s = v + neighbour
+    norm = np.sqrt(np.einsum('ij,ij->i', s, s))
+    bisect = (atstart | atend) & (norm > 1e-12)
+    safenorm = np.where(bisect, norm, 1)
+    return np.where(bisect[:, None], s / safenorm[:, None], v)
+
+
+def _angles(dx, dy):
+    """
+    the angle of the direction (dx, dy): north = 0, clockwise, in [0, 2pi)
+    """
+    angles = np.arctan2(dx, dy) % (pi*2)
+    angles[angles >= pi*2] = 0
+    return angles
+
+
+def _nearest_part(geom, point):
+    """
+    the part of a multi-part geometry nearest to `point`
+    """
+    return min(geom.geoms, key=lambda part: part.distance(point))
+
+
+def _exterior(geom):
+    """
+    the exterior ring of a polygon, the geometry itself for lines
+    """
+    return geom.exterior if hasattr(geom, 'exterior') else geom
+
+
+def _edge_of(geom):
+    return _exterior(edge(geom))
 
 
 def line_angle_at(line, point, h=0.001):
     """
-    return the angle of `line` at the `point` given. I
+    return the angle of `line` at the `point` given (the direction
+    of the line, see angle_from_points)
 
     If point is not in the line, return the angle at the
-    nearest point within the line.
+    nearest point within the line. At a vertex the angle is that of the
+    bisector of the two segments meeting there.
+
+    h: not used, kept for compatibility
     """
     point = Point(*_normalize_point(point))
-    if not line.intersects(point):
-        point = nearest_point(line, point)
-    bufdist = min(line.length, h)
-    c = point.buffer(bufdist).exterior
-    points = c.intersection(line)
-    if isinstance(points, Point):
-        # only one intersection, point is one of the extremes
-        a = points
-        b = line.intersection(point.buffer(bufdist*2).exterior)
-        if not isinstance(b, Point):
-            b = b[0]
-    else:
-        assert len(points) == 2
-        a, b = points
-    return angle_from_points(a.centroid, b.centroid)
+    if hasattr(line, 'geoms'):
+        return line_angle_at(_nearest_part(line, point), point)
+    line = _exterior(line)
+    index = _cached_line_index(line, _exterior)
+    return _tangent_angle(index, line.project(point))
 
 
 def angle_at(geom, point, h=0.00001):
+    """
+    return the angle of the edge of `geom` (see `edge`) at the point
+    nearest to `point`, following the direction of the edge
+
+    h: not used, kept for compatibility
+    """
     if not isinstance(point, Point):
         point = Point(*point)
     geomext = edge(geom)
-    if geomext.contains(point):
-        nearest = point
-    else:
-        nearest = nearest_point(geomext, point)
-    c = nearest.buffer(h).exterior.intersection(geomext)
-    if c.is_empty:
-        return angle_at(geom, nearest, h*3)
-    if isinstance(c, MultiPoint):
-        a, b = c[:2]
-        return angle_from_points(a, b)
-    elif isinstance(c, LineString):
-        a = Point(*c.coords[0])
-        b = Point(*c.coords[-1])
-        return angle_from_points(a, b)
-    elif isinstance(c, MultiLineString):
-        a = c[0].centroid
-        b = c[0].centroid
-        return angle_from_points(a, b)
+    if hasattr(geomext, 'geoms'):
+        return angle_at(_nearest_part(geomext, point), point)
+    geomext = _exterior(geomext)
+    if geomext is geom:
+        index = _cached_line_index(geom, _exterior)
     else:
-        raise ValueError("ooops!")
+        index = _cached_line_index(geom, _edge_of)
+    return _tangent_angle(index, geomext.project(point))
 
 
 def angle_from_points(a, b):
@@ -325,13 +954,141 @@ def angle_from_points(a, b):
     alpha = math.asin(sin_alpha)
     if by < ay:
         if alpha > 0:
-            alpha += pi
+            alpha = pi - alpha
         else:
             alpha = pi + abs(alpha)
     alpha = alpha % (pi*2)
     return alpha
 
 
+def angles_from_points(a_xy, b_xy):
+    """
+    vectorized version of angle_from_points
+
+    a_xy, b_xy: arrays of shape (N, 2)
+
+    Returns
+    =======
+
+    an array of N angles in radians (north = 0, clockwise, in [0, 2pi))
+
+    Example
+    =======
+
+    >>> angles_from_points([(0, 0), (0, 0)], [(1, 1), (0, -1)])
+    array([0.78539816, 3.14159265])
+    """
+    a_xy, b_xy = _as_xy(a_xy), _as_xy(b_xy)
+    d = b_xy - a_xy
+    return _angles(d[:, 0], d[:, 1])
+
+
+def nearest_points(geom, pts):
+    """
+    vectorized version of nearest_point
+
+    geom: a geometry
+    pts: an array of shape (N, 2)
+
+    Returns
+    =======
+
+    an array of shape (N, 2) with the point of `geom` nearest to each
+    point. Points contained in `geom` are returned as they are
+    """
+    pts = _as_xy(pts)
+    segs = util.geom_segments(geom)
+    if len(segs) == 0:
+        raise ValueError("geometry is empty")
+    out = pts.copy()
+    outside = ~_contains_xy(geom, pts[:, 0], pts[:, 1])
+    qx, qy, _, _ = _nearest_on_segments_batch(segs, pts[outside, 0], pts[outside, 1])
+    out[outside, 0] = qx
+    out[outside, 1] = qy
+    return out
+
+
+def _line_angles(index, pts):
+    """
+    the tangent angles of the indexed line at the points nearest to `pts`
+    """
+    coords = index.coords
+    if len(coords) < 2:
+        return np.zeros(len(pts))
+    segs = np.concatenate([coords[:-1], coords[1:]], axis=1)
+    _, _, k, t = _nearest_on_segments_batch(segs, pts[:, 0], pts[:, 1])
+    seglengths = np.diff(index.cumlength)
+    return _tangent_angles(index, index.cumlength[k] + t * seglengths[k])
+
+
+def _multipart_angles(parts, pts):
+    """
+    the angles of the edges of `parts` at the points nearest to `pts`,
+    each point taking the nearest part, as angle_at does for
+    multi-part geometries
+    """
+    segs = [util.geom_segments(part) for part in parts]
+    segpart = np.repeat(np.arange(len(parts)), [len(s) for s in segs])
+    _, _, k, _ = _nearest_on_segments_batch(np.concatenate(segs), pts[:, 0], pts[:, 1])
+    nearest = segpart[k]
+    # a point inside a polygon is at distance 0 from it. The first
+    # containing part wins, as with min() in _nearest_part
+    for i in reversed(range(len(parts))):
+        if parts[i].geom_type == 'Polygon':
+            nearest[_contains_xy(parts[i], pts[:, 0], pts[:, 1])] = i
+    out = np.empty(len(pts))
+    for i in np.unique(nearest):
+        sel = nearest == i
+        out[sel] = _line_angles(_line_index(_edge_of(parts[i])), pts[sel])
+    return out
+
+
+def angles_at(geom, pts):
+    """
+    vectorized version of angle_at
+
+    geom: a geometry
+    pts: an array of shape (N, 2)
+
+    Returns
+    =======
+
+    an array of N angles, the angle of the edge of `geom` at the point
+    nearest to each point (see angle_at)
+    """
+    pts = _as_xy(pts)
+    geomext = edge(geom)
+    if hasattr(geomext, 'geoms'):
+        return _multipart_angles(list(geomext.geoms), pts)
+    geomext = _exterior(geomext)
+    if geomext is geom:
+        index = _cached_line_index(geom, _exterior)
+    else:
+        index = _cached_line_index(geom, _edge_of)
+    return _line_angles(index, pts)
+
+
+def perpendiculars_at(line, pts, length):
+    """
+    vectorized version of perpendicular_at
+
+    line: a linestring
+    pts: an array of shape (N, 2)
+    length: the length of the perpendicular lines
+
+    Returns
+    =======
+
+    an array of shape (N, 2, 2), where out[i] holds the two extremes
+    of the perpendicular line at pts[i]
+    """
+    pts = _as_xy(pts)
+    index = _cached_line_index(line, _exterior)
+    a2 = _line_angles(index, pts) + pi/2
+    v = np.stack([np.sin(a2), np.cos(a2)], axis=1) * (length * 0.5)
+    return np.stack([pts + v, pts - v], axis=1)
+
+
 def edge(geom):
     """
     return a polygon representing the edge of `geom`
@@ -347,53 +1104,101 @@ def edge(geom):
     return geomext
 
 
+def _nearest_on_segments(segs, x, y):
+    """
+    the point on the segments `segs` (an array of (x0, y0, x1, y1),
+    see util.geom_segments) nearest to (x, y)
+
+    Returns
+    =======
+
+    (qx, qy, index) where index is the segment on which the point lies
+    """
+    ax, ay, bx, by = segs.T
+    dx, dy = bx - ax, by - ay
+    dd = dx*dx + dy*dy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(dd > 0, ((x - ax)*dx + (y - ay)*dy) / dd, 0)
+    np.clip(t, 0, 1, out=t)
+    qx = ax + t*dx
+    qy = ay + t*dy
+    i = int(np.argmin((qx - x)**2 + (qy - y)**2))
+    return qx[i], qy[i], i
+
+
+def _nearest_on_segments_batch(segs, xs, ys):
+    """
+    vectorized version of _nearest_on_segments for many points, processed
+    in chunks to bound memory
+
+    Returns
+    =======
+
+    (qx, qy, index, t): the nearest points, the segment each one lies on
+    and its position along it (0-1)
+    """
+    n = len(xs)
+    qx, qy = np.empty(n), np.empty(n)
+    index = np.empty(n, dtype=np.int64)
+    t = np.empty(n)
+    ax, ay, bx, by = segs.T
+    dx, dy = bx - ax, by - ay
+    dd = dx*dx + dy*dy
+    safe = np.where(dd > 0, dd, 1)
+    chunk = max(1, (1 << 22) // max(len(segs), 1))
+    for i0 in range(0, n, chunk):
+        x = xs[i0:i0+chunk, None]
+        y = ys[i0:i0+chunk, None]
+        tt = np.clip(((x - ax)*dx + (y - ay)*dy) / safe, 0, 1)
+        px = ax + tt*dx
+        py = ay + tt*dy
+        i = np.argmin((px - x)**2 + (py - y)**2, axis=1)
+        rows = np.arange(len(i))
+        qx[i0:i0+chunk] = px[rows, i]
+        qy[i0:i0+chunk] = py[rows, i]
+        t[i0:i0+chunk] = tt[rows, i]
+        index[i0:i0+chunk] = i
+    return qx, qy, index, t
+
+
+def _contains_xy(geom, xs, ys):
+    """
+    vectorized geom.contains for the points (xs, ys)
+    """
+    try:
+        from shapely import contains_xy
+    except ImportError:
+        from shapely.vectorized import contains as contains_xy
+    return np.asarray(contains_xy(geom, xs, ys), dtype=bool)
+
+
+def _as_xy(pts):
+    """
+    convert `pts` to a float array of shape (N, 2)
+    """
+    pts = np.asarray(pts, dtype=float)
+    return pts.reshape(-1, 2)
+
+
 def nearest_point(geom, p, eps=None):
     """
     find the point in `geom` which is nearest from point `p`
 
-    eps: epsilon
+    If `p` is contained in `geom`, `p` is returned. Otherwise `p` is
+    projected onto each segment of `geom` (for polygons, the segments of
+    the exterior and the interiors) and the nearest projection is returned
+
+    eps: not used, kept for compatibility
     """
-    MINDIST = 1e-16
     if not isinstance(p, Point):
         p = Point(*p)
     if geom.contains(p):
         return p
-    if eps is None:
-        eps = geom.distance(p) * 0.0001
-    dist = geom.distance(p)
-    if dist < MINDIST:
-        dist = 1e-12
-
-    try:
-        circunf = p.buffer(dist+eps)
-        p2 = circunf.exterior.intersection(geom)
-    except _TopologicalError:
-        return nearest_point(geom, p, eps*3)
-
-    if circunf.contains(geom):
-        # we are probably near the centroid of the geom, inside it
-        n = geom.representative_point()
-        assert abs(n.distance(p) - geom.distance(p)) < 1e-3
-        return n
-
-    if p2.is_empty:
-        # eps is too small, try with a larger one
-        return nearest_point(geom, p, eps*6)
-
-    if isinstance(p2, MultiPoint):
-        a = p2[0]
-        b = p2[1]
-        p3 = linestr(a, b).centroid
-    elif isinstance(p2, Polygon):
-        p3 = linestr(p2.centroid, p).intersection(p2.exterior)
-    elif isinstance(p2, LineString):
-        p3 = p2.centroid
-    elif isinstance(p2, MultiLineString):
-        p3 = p2[0].centroid
-    else:
-        raise TypeError("other geometries not supported YET")
-    assert not p3.is_empty and isinstance(p3, Point)
-    return p3
+    segs = util.geom_segments(geom)
+    if len(segs) == 0:
+        raise ValueError("geometry is empty")
+    qx, qy, _ = _nearest_on_segments(segs, p.x, p.y)
+    return Point(qx, qy)
 
 
 def holes(geom):
@@ -0,0 +1,376 @@
+"""
+Columnar geometry arrays: the coordinates of many geometries in one
+contiguous buffer, with offsets in the GeoArrow style
+"""
+from __future__ import absolute_import
+
+import numpy as np
+from shapely.geometry import (
+    Polygon, LineString, LinearRing, Point, MultiPolygon, MultiLineString,
+    MultiPoint, GeometryCollection
+)
+
+from .core import _broadcast, _instances, _rect_coords
+
+# the type of each part
+_PARTTYPES = ('Polygon', 'LineString', 'LinearRing', 'Point')
+_POLYGON, _LINESTRING, _LINEARRING, _POINT = range(4)
+# the type of each geometry
+_GEOMTYPES = ('Polygon', 'LineString', 'LinearRing', 'Point',
+              'MultiPolygon', 'MultiLineString', 'MultiPoint', 'GeometryCollection')
+_MULTI = {'MultiPolygon': MultiPolygon, 'MultiLineString': MultiLineString,
+          'MultiPoint': MultiPoint, 'GeometryCollection': GeometryCollection}
+
+_ARRAYS = ('coords', 'ring_offsets', 'part_offsets', 'geom_offsets', 'part_types',
+           'geom_types')
+
+
+def _iter_parts(geom):
+    if hasattr(geom, 'geoms'):
+        for sub in geom.geoms:
+            for part in _iter_parts(sub):
+                yield part
+    elif not geom.is_empty:
+        yield geom
+
+
+def _ranges(offsets, indices):
+    """
+    the concatenation of the ranges [offsets[i], offsets[i+1]) for each index
+    """
+    starts = offsets[indices]
+    counts = offsets[indices + 1] - starts
+    return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+
+class GeometryArray(object):
+    """
+    An array of geometries stored in columns
+
+    coords:       float64 array of shape (numcoords, 2), all the coordinates
+    ring_offsets: the coordinates of ring i are coords[ring_offsets[i]:ring_offsets[i+1]]
+    part_offsets: the rings of part j are ring_offsets[part_offsets[j]:part_offsets[j+1]].
+                  For polygons, the first ring is the exterior. Lines,
+                  rings and points have one ring
+    geom_offsets: the parts of geometry k are part_offsets[geom_offsets[k]:geom_offsets[k+1]]
+    part_types:   uint8 array, the type of each part (Polygon, LineString,
+                  LinearRing, Point)
+    geom_types:   uint8 array, the type of each geometry (see _GEOMTYPES)
+
+    Only these arrays are kept: indexing returns a new shapely geometry,
+    built from the coordinates. A GeometryArray can be passed to the
+    rasterizers and to the plotting functions, which read its coordinates
+    directly (rasterize_coverage, which merges overlapping polygons,
+    converts it to shapely).
+    It can be pickled, and placed in shared memory (see to_shared_memory),
+    in which case pickling it passes only a reference to the memory block
+
+    Example
+    =======
+
+    >>> from shapelib import circle
+    >>> ga = GeometryArray.circles([0, 10], 0, 1)
+    >>> len(ga), ga.bounds
+    (2, (-1.0, -1.0, 11.0, 1.0))
+    >>> ga[1].equals(circle(10, 0, 1))
+    True
+    """
+    def __init__(self, coords, ring_offsets, part_offsets, geom_offsets, part_types,
+                 geom_types):
+        self.coords = coords
+        self.ring_offsets = ring_offsets
+        self.part_offsets = part_offsets
+        self.geom_offsets = geom_offsets
+        self.part_types = part_types
+        self.geom_types = geom_types
+        self._shm = None
+
+    @classmethod
+    def from_shapely(cls, geoms):
+        """
+        create a GeometryArray from a sequence of shapely geometries
+        (or from a multi-geometry, one item per sub-geometry)
+        """
+        if hasattr(geoms, 'geoms'):
+            geoms = geoms.geoms
+        rings, parttypes, geomtypes = [], [], []
+        ringcounts, partcounts = [], []
+        for geom in geoms:
+            geomtypes.append(_GEOMTYPES.index(geom.geom_type))
+            numparts = 0
+            for part in _iter_parts(geom):
+                parttype = _PARTTYPES.index(part.geom_type)
+                if parttype == _POLYGON:
+                    partrings = [part.exterior] + list(part.interiors)
+                else:
+                    partrings = [part]
+                rings.extend(np.asarray(ring.coords)[:, :2] for ring in partrings)
+                ringcounts.append(len(partrings))
+                parttypes.append(parttype)
+                numparts += 1
+            partcounts.append(numparts)
+        coords = np.concatenate(rings) if rings else np.empty((0, 2))
+        return cls(np.ascontiguousarray(coords, dtype=np.float64),
+                   _offsets([len(ring) for ring in rings]),
+                   _offsets(ringcounts),
+                   _offsets(partcounts),
+                   np.array(parttypes, dtype=np.uint8),
+                   np.array(geomtypes, dtype=np.uint8))
+
+    @classmethod
+    def _from_rings(cls, rings, holes=None, empty=None):
+        """
+        polygons from an array of shape (N, numvertices, 2) of closed
+        exteriors, and optionally one hole each. The polygons where
+        `empty` is True have no parts
+        """
+        n = len(rings)
+        geomparts = np.ones(n, dtype=np.int64)
+        if empty is not None:
+            geomparts[empty] = 0
+            rings = rings[~empty]
+            holes = None if holes is None else holes[~empty]
+        numparts, size = rings.shape[:2]
+        if holes is None:
+            coords = rings.reshape(-1, 2)
+            ringsperpart = 1
+        else:
+            coords = np.concatenate([rings, holes], axis=1).reshape(-1, 2)
+            ringsperpart = 2
+        return cls(np.ascontiguousarray(coords),
+                   np.arange(numparts * ringsperpart + 1, dtype=np.int64) * size,
+                   np.arange(numparts + 1, dtype=np.int64) * ringsperpart,
+                   _offsets(geomparts),
+                   np.zeros(numparts, dtype=np.uint8),
+                   np.zeros(n, dtype=np.uint8))
+
+    @classmethod
+    def circles(cls, centerx, centery, radius, resolution=16):
+        """
+        same as core.circles, without creating any shapely object
+        """
+        cx, cy, radius = _broadcast(centerx, centery, radius)
+        return cls._from_rings(_closed(_instances(radius, resolution, cx, cy)),
+                               empty=radius <= 0)
+
+    @classmethod
+    def rings(cls, centerx, centery, radius, width, resolution=16):
+        """
+        same as core.rings, without creating any shapely object.
+        All the rings should be narrower than their radius. Rings with
+        a radius or a width <= 0 are empty
+        """
+        cx, cy, radius, width = _broadcast(centerx, centery, radius, width)
+        empty = (radius <= 0) | (width <= 0)
+        if np.any((width >= radius) & ~empty):
+            raise ValueError("the width of each ring should be less than its radius")
+        outer = _instances(radius, resolution, cx, cy)
+        inner = _instances(np.where(empty, radius, radius - width), resolution, cx, cy,
+                           reverse=True)
+        return cls._from_rings(_closed(outer), _closed(inner), empty=empty)
+
+    @classmethod
+    def rect_polys(cls, x0, y0, x1, y1):
+        """
+        same as core.rect_polys, without creating any shapely object
+        """
+        return cls._from_rings(_closed(_rect_coords(x0, y0, x1, y1)))
+
+    def __len__(self):
+        return len(self.geom_types)
+
+    def _part(self, j):
+        rings = [self.coords[self.ring_offsets[i]:self.ring_offsets[i+1]]
+                 for i in range(self.part_offsets[j], self.part_offsets[j+1])]
+        parttype = self.part_types[j]
+        if parttype == _POLYGON:
+            return Polygon(rings[0], rings[1:])
+        if parttype == _LINESTRING:
+            return LineString(rings[0])
+        if parttype == _LINEARRING:
+            return LinearRing(rings[0])
+        return Point(rings[0][0])
+
+    def __getitem__(self, k):
+        """
+        the k-th geometry, as a shapely geometry
+        """
+        if k < 0:
+            k += len(self)
+        parts = [self._part(j) for j in range(self.geom_offsets[k], self.geom_offsets[k+1])]
+        geomtype = _GEOMTYPES[self.geom_types[k]]
+        if geomtype in _MULTI:
+            return _MULTI[geomtype](parts)
+        if not parts:
+            return Polygon() if geomtype == 'Polygon' else GeometryCollection()
+        return parts[0]
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+    def to_shapely(self):
+        """
+        all the geometries as a shapely GeometryCollection
+        """
+        return GeometryCollection(list(self))
+
+    @property
+    def bounds(self):
+        """
+        the bounds (x0, y0, x1, y1) of all the geometries
+        """
+        if len(self.coords) == 0:
+            return ()
+        lo = self.coords.min(axis=0)
+        hi = self.coords.max(axis=0)
+        return (float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1]))
+
+    @property
+    def nbytes(self):
+        """
+        the memory used by the arrays, in bytes
+        """
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+    def polygon_rings(self):
+        """
+        the rings of the polygons
+
+        Returns
+        =======
+
+        (coords, ring_offsets, groups) where the coordinates of ring i are
+        coords[ring_offsets[i]:ring_offsets[i+1]] and groups[i] is the index
+        of the polygon it belongs to
+        """
+        ispolygon = self.part_types == _POLYGON
+        if ispolygon.all():
+            groups = np.repeat(np.arange(len(ispolygon)), np.diff(self.part_offsets))
+            return self.coords, self.ring_offsets, groups
+        parts = np.flatnonzero(ispolygon)
+        rings = _ranges(self.part_offsets, parts)
+        groups = np.repeat(np.arange(len(parts)), np.diff(self.part_offsets)[parts])
+        coords = self.coords[_ranges(self.ring_offsets, rings)]
+        return coords, _offsets(np.diff(self.ring_offsets)[rings]), groups
+
+    def segments(self):
+        """
+        all the segments of the rings, lines and points, as in
+        util.geom_segments (points are segments of length 0)
+
+        Returns
+        =======
+
+        an array of shape (numsegments, 4), where each row is (x0, y0, x1, y1)
+        """
+        lengths = np.diff(self.ring_offsets)
+        ringids = np.repeat(np.arange(len(lengths)), lengths)
+        starts = np.flatnonzero(ringids[:-1] == ringids[1:])
+        # rings of one coordinate (points) are segments to themselves
+        starts = np.sort(np.concatenate([starts, self.ring_offsets[:-1][lengths == 1]]))
+        ends = np.where(lengths[ringids[starts]] == 1, starts, starts + 1)
+        return np.concatenate([self.coords[starts], self.coords[ends]], axis=1)
+
+    def nonpolygon_parts(self):
+        """
+        the parts which are not polygons (lines, rings, points),
+        as shapely geometries
+        """
+        return [self._part(j) for j in np.flatnonzero(self.part_types != _POLYGON)]
+
+    @property
+    def __geo_interface__(self):
+        return {'type': 'GeometryCollection',
+                'geometries': [self._geo_interface(k) for k in range(len(self))]}
+
+    def _geo_interface(self, k):
+        def ringcoords(i):
+            return self.coords[self.ring_offsets[i]:self.ring_offsets[i+1]].tolist()
+
+        parts = []
+        for j in range(self.geom_offsets[k], self.geom_offsets[k+1]):
+            rings = [ringcoords(i) for i in range(self.part_offsets[j], self.part_offsets[j+1])]
+            parttype = self.part_types[j]
+            if parttype == _POLYGON:
+                parts.append({'type': 'Polygon', 'coordinates': rings})
+            elif parttype == _POINT:
+                parts.append({'type': 'Point', 'coordinates': rings[0][0]})
+            else:
+                parts.append({'type': 'LineString', 'coordinates': rings[0]})
+        geomtype = _GEOMTYPES[self.geom_types[k]]
+        if geomtype == 'GeometryCollection' or not parts:
+            return {'type': 'GeometryCollection', 'geometries': parts}
+        if geomtype in _MULTI:
+            return {'type': geomtype, 'coordinates': [p['coordinates'] for p in parts]}
+        return parts[0]
+
+    def to_shared_memory(self):
+        """
+        copy the arrays into a new block of shared memory
+
+        Returns
+        =======
+
+        (garray, shm) where garray is a GeometryArray whose arrays live in
+        shm, a multiprocessing.shared_memory.SharedMemory. Pickling garray
+        (for example, to pass it to a worker process) only passes the name
+        of the block and the layout of the arrays, the coordinates are not
+        copied. The caller owns shm and should close and unlink it when done
+        """
+        from multiprocessing import shared_memory
+        arrays = [getattr(self, name) for name in _ARRAYS]
+        layout = []
+        offset = 0
+        for array in arrays:
+            # keep each array aligned to 8 bytes
+            offset = (offset + 7) // 8 * 8
+            layout.append((offset, array.dtype.str, array.shape))
+            offset += array.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        shared = _attach_arrays(shm, layout)
+        for dest, array in zip(shared, arrays):
+            dest[...] = array
+        garray = GeometryArray(*shared)
+        garray._shm = (shm, layout)
+        return garray, shm
+
+    def __reduce__(self):
+        if self._shm is not None:
+            shm, layout = self._shm
+            return _from_shared_memory, (shm.name, layout)
+        return GeometryArray, tuple(getattr(self, name) for name in _ARRAYS)
+
+    def __repr__(self):
+        return "GeometryArray(numgeoms={0}, numcoords={1})".format(len(self), len(self.coords))
+
+
+def _offsets(counts):
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def _closed(rings):
+    """
+    append the first vertex to the end of each ring of an array
+    of shape (N, numvertices, 2)
+    """
+    return np.concatenate([rings, rings[:, :1]], axis=1)
+
+
+def _attach_arrays(shm, layout):
+    return [np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for offset, dtype, shape in layout]
+
+
+def _from_shared_memory(name, layout):
+    """
+    a GeometryArray whose arrays are views of an existing block of
+    shared memory (used when unpickling)
+    """
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=name)
+    garray = GeometryArray(*_attach_arrays(shm, layout))
+    garray._shm = (shm, layout)
+    return garray
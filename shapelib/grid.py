@@ -1,59 +1,104 @@
 ###########################################
-# Old and unused, will be probably removed
+#
+# Rasterization on rectangular grids
+#
 ###########################################
 from __future__ import absolute_import
 from __future__ import print_function
+import warnings
 import numpy
-from shapely.topology import TopologicalError as _TopologicalError
-from shapely.geometry import box
-from six.moves import range
-from six.moves import zip
+from shapely.geometry import GeometryCollection
+
+from .geometryarray import GeometryArray
+from .scene import Scene
+from .raster import _geom_edges, _scanline_spans, _fill_spans
 
 
 class Grid(object):
+    """
+    A grid of stepx x stepy cells, starting at (x0, y0) and covering
+    the rectangle (x0, y0, x1, y1)
+
+    xs, ys: the left / bottom coordinate of each column / row
+
+    The grid holds no state about the geometries rasterized on it, so
+    the same grid can be used for any number of geometries
+
+    Example
+    =======
+
+    >>> from shapelib import rect_poly
+    >>> grid = Grid(10, 0, 14, 3, stepx=1, stepy=0.5)
+    >>> grid.rasterize(rect_poly(11, 1, 13, 2))
+    array([[0., 0., 0., 0.],
+           [0., 0., 0., 0.],
+           [0., 1., 1., 0.],
+           [0., 1., 1., 0.],
+           [0., 0., 0., 0.],
+           [0., 0., 0., 0.]])
+    """
     def __init__(self, x0, y0, x1, y1, stepx, stepy):
         self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
         self.stepx, self.stepy = stepx, stepy
         self.xs = numpy.arange(x0, x1, stepx)
         self.ys = numpy.arange(y0, y1, stepy)
-        self.xlines = [box(x, y0, x+stepx, y1) for x in self.xs]
+
+    @property
+    def shape(self):
+        """
+        the shape (rows, cols) of the arrays returned by rasterize
+        """
+        return len(self.ys), len(self.xs)
+
+    def _edges(self, geom):
+        """
+        the edges of geom in cell coordinates, transposed, so that the
+        scanlines run along the columns: each edge is (v0, u0, v1, u1),
+        where column j has its center at u = j + 0.5 and row i at v = i + 0.5
+        """
+        if isinstance(geom, Scene):
+            geom = geom.clip((self.x0, self.y0, self.x1, self.y1))
+        elif not (hasattr(geom, 'geom_type') or isinstance(geom, GeometryArray)):
+            geom = GeometryCollection(list(geom))
+        # lines are rendered as wide as the smallest side of a cell
+        edges, groups = _geom_edges(geom, 1.0 / min(self.stepx, self.stepy))
+        cells = numpy.empty_like(edges)
+        cells[:, 0::2] = (edges[:, 1::2] - self.y0) / self.stepy
+        cells[:, 1::2] = (edges[:, 0::2] - self.x0) / self.stepx
+        return cells, groups
+
+    def rasterize(self, geom, out=None):
+        """
+        rasterize the geometry on this grid
+
+        All the columns are computed at once: the edges of the geometry
+        are intersected with the center line of each column they cross,
+        and the rows between each pair of crossings are filled (even-odd,
+        per polygon). A cell is set if its center lies inside the geometry
+
+        geom: a shapely geometry, a sequence of geometries, a GeometryArray
+              or a Scene. Multiple geometries are merged
+        out: if given, an array of shape grid.shape to write the result to
+
+        Returns
+        =======
+
+        a 2D array of shape (len(ys), len(xs)), 0-1, where out[i, j] is the
+        cell at row i (counting from y0 upwards) and column j
+        """
+        rows, cols = self.shape
+        if out is None:
+            out = numpy.zeros((rows, cols), dtype=float)
+        elif out.shape != (rows, cols):
+            raise ValueError("out should have the shape {0}".format((rows, cols)))
+        edges, groups = self._edges(geom)
+        columns, starts, ends = _scanline_spans(edges, groups, 0, cols, 0, rows)
+        # the spans of each column are filled on a transposed mask
+        mask = numpy.empty((cols, rows), dtype=numpy.uint8)
+        _fill_spans(mask, columns, starts, ends)
+        out[...] = mask.T
+        return out
 
     def rasterize2(self, geom):
-        x0, y0, x1, y1 = [int(value / self.stepx) for value in geom.bounds]
-        xs = list(range(x0, x1+1))
-        mat = numpy.zeros((len(self.xs), len(self.ys)), dtype=float)
-        stepy = self.stepy
-        for x, band in zip(xs, self.xlines[x0:x1+1]):
-            intersect_x = band.intersection(geom)
-            if not intersect_x.is_empty:
-                if not hasattr(intersect_x, '__iter__'):
-                    intersect_x = [intersect_x]
-                for sub in intersect_x:
-                    _, y0, _, y1 = (int(v/stepy) for v in sub.bounds)
-                    mat[y0:y1+1, x] = 1
-        return mat
-
-    def rasterize(self, geom):
-        x0, y0, x1, y1 = [int(value / self.stepx) for value in geom.bounds]
-        mat = numpy.zeros((len(self.ys), len(self.xs)), dtype=float)
-        xs = list(range(x0, x1+1))
-        stepy = self.stepy
-        E = 1e-4
-        for x, band in zip(xs, self.xlines[x0:x1+1]):
-            try:
-                intersect_x = band.intersection(geom)
-            except _TopologicalError:
-                band1 = band.buffer(E)
-                try:
-                    intersect_x = band1.intersection(geom)
-                except _TopologicalError:
-                    print("topological error at x: {0}".format(x))
-                    continue
-            if not hasattr(intersect_x, '__iter__'):
-                intersect_x = [intersect_x]
-            for sub in intersect_x:
-                ys = sub.ctypes[1::2]
-                y0 = int(min(ys)/stepy)
-                y1 = int(max(ys)/stepy)
-                mat[y0:y1+1, x] = 1
-        return mat
+        warnings.warn("deprecated, use rasterize", DeprecationWarning, stacklevel=2)
+        return self.rasterize(geom)
@@ -0,0 +1,274 @@
+##########################################
+#
+# Compact binary masks
+#
+###########################################
+from __future__ import absolute_import
+import numpy as np
+
+
+def _prefix_xor_table():
+    """
+    for each byte, the prefix xor of its bits, starting at the most
+    significant bit (the bit order of np.packbits)
+    """
+    bits = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1)
+    return np.packbits(np.bitwise_xor.accumulate(bits, axis=1), axis=1)[:, 0]
+
+
+_PREFIX_XOR = _prefix_xor_table()
+
+
+def _merge_spans(pos0, pos1):
+    """
+    merge the sorted, linearized spans [pos0, pos1) which touch each other
+    """
+    if len(pos0) == 0:
+        return pos0, pos1
+    new = np.empty(len(pos0), dtype=bool)
+    new[0] = True
+    new[1:] = pos0[1:] > pos1[:-1]
+    heads = np.flatnonzero(new)
+    return pos0[heads], np.maximum.reduceat(pos1, heads)
+
+
+def _combine_spans(shape, spans1, spans2, predicate):
+    """
+    combine two sets of disjoint spans (rows, starts, ends) of masks
+    of the given shape. `predicate` gets the number of masks covering
+    each interval (0, 1 or 2) and returns True where the result is set
+    """
+    width = shape[1] + 1
+    pos = np.concatenate([spans1[0] * width + spans1[1], spans1[0] * width + spans1[2],
+                          spans2[0] * width + spans2[1], spans2[0] * width + spans2[2]])
+    n1, n2 = len(spans1[0]), len(spans2[0])
+    delta = np.concatenate([np.ones(n1, np.int64), -np.ones(n1, np.int64),
+                            np.ones(n2, np.int64), -np.ones(n2, np.int64)])
+    empty = np.empty((0,), dtype=np.int64)
+    if len(pos) == 0:
+        return empty, empty, empty
+    order = np.argsort(pos, kind='stable')
+    pos, delta = pos[order], delta[order]
+    heads = np.flatnonzero(np.concatenate([[True], pos[1:] != pos[:-1]]))
+    pos = pos[heads]
+    level = np.cumsum(np.add.reduceat(delta, heads))
+    # the interval [pos[k], pos[k+1]) is covered by level[k] masks
+    selected = np.flatnonzero(predicate(level[:-1]))
+    pos0, pos1 = _merge_spans(pos[selected], pos[selected + 1])
+    rows = pos0 // width
+    return rows, pos0 - rows * width, pos1 - rows * width
+
+
+class RLEMask(object):
+    """
+    A binary mask stored as runs of set pixels, per row
+
+    shape:   (rows, cols) of the mask
+    indptr:  array of shape (rows+1,). The runs of row i are
+             starts[indptr[i]:indptr[i+1]], lengths[indptr[i]:indptr[i+1]]
+    starts:  the column where each run begins
+    lengths: the number of pixels of each run
+
+    Runs are sorted, disjoint and never adjacent.
+    Supports &, |, ^ and ~ with other RLEMasks
+    """
+    def __init__(self, shape, indptr, starts, lengths):
+        self.shape = tuple(shape)
+        self.indptr = indptr
+        self.starts = starts
+        self.lengths = lengths
+
+    @classmethod
+    def from_spans(cls, shape, rows, starts, ends):
+        """
+        create a RLEMask from disjoint, sorted spans [start, end) per row
+        """
+        indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=shape[0]), out=indptr[1:])
+        return cls(shape, indptr, np.asarray(starts, dtype=np.int64),
+                   np.asarray(ends - starts, dtype=np.int64))
+
+    @classmethod
+    def from_dense(cls, array):
+        """
+        create a RLEMask from a 2D array (nonzero = set)
+        """
+        array = np.asarray(array) != 0
+        rows, cols = array.shape
+        padded = np.zeros((rows, cols + 2), dtype=np.int8)
+        padded[:, 1:-1] = array
+        r, c = np.nonzero(np.diff(padded, axis=1))
+        # transitions alternate between the start and the end of a run
+        return cls.from_spans((rows, cols), r[0::2], c[0::2], c[1::2])
+
+    def spans(self):
+        """
+        the runs as (rows, starts, ends)
+        """
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        return rows, self.starts, self.starts + self.lengths
+
+    def row(self, i):
+        """
+        the runs of row i, as a list of (start, length)
+        """
+        a, b = self.indptr[i], self.indptr[i + 1]
+        return list(zip(self.starts[a:b].tolist(), self.lengths[a:b].tolist()))
+
+    def count(self):
+        """
+        the number of set pixels
+        """
+        return int(self.lengths.sum())
+
+    def to_dense(self):
+        """
+        convert to a 2D uint8 array (0-1)
+        """
+        out = np.zeros(self.shape, dtype=np.uint8)
+        rows, starts, ends = self.spans()
+        out[rows, starts] = 1
+        inside = ends < self.shape[1]
+        out[rows[inside], ends[inside]] = 1
+        np.bitwise_xor.accumulate(out, axis=1, out=out)
+        return out
+
+    def to_packed(self):
+        """
+        convert to a PackedMask
+        """
+        return PackedMask.from_spans(self.shape, *self.spans())
+
+    def _combine(self, other, predicate):
+        if not isinstance(other, RLEMask):
+            return NotImplemented
+        if other.shape != self.shape:
+            raise ValueError("masks should have the same shape")
+        spans = _combine_spans(self.shape, self.spans(), other.spans(), predicate)
+        return RLEMask.from_spans(self.shape, *spans)
+
+    def __and__(self, other):
+        return self._combine(other, lambda level: level == 2)
+
+    def __or__(self, other):
+        return self._combine(other, lambda level: level >= 1)
+
+    def __xor__(self, other):
+        return self._combine(other, lambda level: level == 1)
+
+    def __invert__(self):
+        rows, cols = self.shape
+        full = (np.arange(rows), np.zeros(rows, dtype=np.int64), np.full(rows, cols))
+        spans = _combine_spans(self.shape, self.spans(), full, lambda level: level == 1)
+        return RLEMask.from_spans(self.shape, *spans)
+
+    def __repr__(self):
+        return "RLEMask(shape={0}, runs={1})".format(self.shape, len(self.starts))
+
+
+class PackedMask(object):
+    """
+    A binary mask stored with 1 bit per pixel
+
+    bits:  uint8 array of shape (rows, ceil(cols/8)), each row packed
+           with np.packbits (the first pixel is the most significant bit)
+    shape: (rows, cols) of the mask
+
+    Supports &, |, ^ and ~ with other PackedMasks
+    """
+    def __init__(self, bits, shape):
+        self.bits = bits
+        self.shape = tuple(shape)
+
+    @classmethod
+    def from_spans(cls, shape, rows, starts, ends):
+        """
+        create a PackedMask from disjoint spans [start, end) per row,
+        without going through a dense array
+        """
+        numrows, cols = shape
+        nbytes = (cols + 7) // 8
+        bits = np.zeros((numrows, nbytes), dtype=np.uint8)
+        # mark the first pixel of each span and the first pixel after it
+        inside = ends < cols
+        toggles = np.concatenate([starts, ends[inside]])
+        togglerows = np.concatenate([rows, rows[inside]])
+        np.bitwise_xor.at(bits, (togglerows, toggles >> 3),
+                          (0x80 >> (toggles & 7)).astype(np.uint8))
+        # prefix xor over the bits of each row: within each byte via a
+        # table, across bytes via the parity of the preceding bytes
+        parity = _PREFIX_XOR[bits] & 1
+        carry = np.bitwise_xor.accumulate(parity, axis=1)
+        carry[:, 1:] = carry[:, :-1].copy()
+        carry[:, 0] = 0
+        bits = _PREFIX_XOR[bits] ^ (carry * np.uint8(0xFF))
+        return cls(_clear_padding(bits, cols), shape)
+
+    @classmethod
+    def from_dense(cls, array):
+        """
+        create a PackedMask from a 2D array (nonzero = set)
+        """
+        array = np.asarray(array) != 0
+        return cls(np.packbits(array, axis=1), array.shape)
+
+    def to_dense(self):
+        """
+        convert to a 2D uint8 array (0-1)
+        """
+        return np.unpackbits(self.bits, axis=1, count=self.shape[1])
+
+    def to_rle(self, band_rows=256):
+        """
+        convert to a RLEMask. The conversion is done in bands of
+        `band_rows` rows, to bound memory
+        """
+        spans = [[], [], []]
+        for row0 in range(0, self.shape[0], band_rows):
+            band = RLEMask.from_dense(
+                np.unpackbits(self.bits[row0:row0+band_rows], axis=1, count=self.shape[1]))
+            rows, starts, ends = band.spans()
+            spans[0].append(rows + row0)
+            spans[1].append(starts)
+            spans[2].append(ends)
+        if not spans[0]:
+            empty = np.empty((0,), dtype=np.int64)
+            return RLEMask.from_spans(self.shape, empty, empty, empty)
+        return RLEMask.from_spans(self.shape, *[np.concatenate(s) for s in spans])
+
+    def count(self):
+        """
+        the number of set pixels
+        """
+        return int(np.unpackbits(self.bits).sum())
+
+    def _combine(self, other, op):
+        if not isinstance(other, PackedMask):
+            return NotImplemented
+        if other.shape != self.shape:
+            raise ValueError("masks should have the same shape")
+        return PackedMask(op(self.bits, other.bits), self.shape)
+
+    def __and__(self, other):
+        return self._combine(other, np.bitwise_and)
+
+    def __or__(self, other):
+        return self._combine(other, np.bitwise_or)
+
+    def __xor__(self, other):
+        return self._combine(other, np.bitwise_xor)
+
+    def __invert__(self):
+        return PackedMask(_clear_padding(~self.bits, self.shape[1]), self.shape)
+
+    def __repr__(self):
+        return "PackedMask(shape={0})".format(self.shape)
+
+
+def _clear_padding(bits, cols):
+    """
+    clear the bits after the last column of each row
+    """
+    if cols % 8 and bits.shape[1]:
+        bits[:, -1] &= np.uint8((0xFF << (8 - cols % 8)) & 0xFF)
+    return bits
@@ -4,15 +4,21 @@
 #
 ###########################################
 from __future__ import absolute_import
+import logging
 from matplotlib import pyplot
 from . import util
 from shapely.geometry import Polygon
+from .geometryarray import GeometryArray
+from .raster import _select_scene
+
+logger = logging.getLogger(__name__)
 
 
 def geom_to_fig(geom, xrange=None, yrange=None, axis_visible=True,
                 patchkws={}, aspect=1, linewidth=0.01, fig=None):
     """
-    convert a shapely geometry to a matplotlib figure
+    convert a shapely geometry (or a Scene, or a GeometryArray) to a
+    matplotlib figure
 
     If xrange and yrange are given, use them.
     If not, the bounds of the geometry are used
@@ -34,6 +40,7 @@ def geom_to_fig(geom, xrange=None, yrange=None, axis_visible=True,
         import descartes
     except ImportError:
         raise ImportError("descartes is needed to plot geometries")
+    geom, xrange, yrange = _select_scene(geom, xrange, yrange)
     x0, y0, x1, y1 = util.geom_getbounds(geom, xrange, yrange)
     if fig is None:
         #fig = pyplot.figure(1, figsize=(xsize, ysize))
@@ -41,7 +48,16 @@ def geom_to_fig(geom, xrange=None, yrange=None, axis_visible=True,
         ax = fig.add_subplot(111)
     else:
         ax = fig.gca()
-    if isinstance(geom, Polygon):
+    if isinstance(geom, GeometryArray):
+        # drawn as one path, built directly from the coordinates
+        from matplotlib.patches import PathPatch
+        from .raster import _geom_to_path
+        path = _geom_to_path(geom, 0.5 / linewidth)
+        pa = PathPatch(path, **patchkws) if path is not None else None
+    elif geom.is_empty:
+        # nothing to draw, only the axes
+        pa = None
+    elif isinstance(geom, Polygon):
         p = geom.__geo_interface__
     else:
         geom0 = geom.buffer(linewidth)
@@ -60,8 +76,10 @@ def geom_to_fig(geom, xrange=None, yrange=None, axis_visible=True,
     ax.set_xlim(x0, x1)
     ax.set_ylim(y0, y1)
     ax.set_aspect(aspect)
-    pa = descartes.PolygonPatch(p, **patchkws)
-    ax.add_patch(pa)
+    if not isinstance(geom, GeometryArray) and not geom.is_empty:
+        pa = descartes.PolygonPatch(p, **patchkws)
+    if pa is not None:
+        ax.add_patch(pa)
     return fig
 
 
@@ -84,11 +102,11 @@ def geom_plot(geom, xrange=None, yrange=None, axis_visible=True, patchkws={}, as
 
     
 def geom_to_picture(geom, filename, xrange=None, yrange=None, axis_visible=True,
-                    pixratio=150, patchkws={'color': '#000000'}, dpi=None):
+                    pixratio=150, patchkws={'color': '#000000'}, dpi=None, lod=True):
     """
     Save a geometry as a picture
 
-    geom: a geometry
+    geom: a geometry, a Scene or a GeometryArray
     filename: the filename of the picture. The extension determines the format
     xrange, yrange: use it to save a selection of the picture.
                     None => select the entire geometry
@@ -103,6 +121,9 @@ def geom_to_picture(geom, filename, xrange=None, yrange=None, axis_visible=True,
     NB: when saving to raster files (png, jpg, etc.) the size in pixels of
         the image will be (xsize * (dpi/2), ysize * (dpi/2))
 
+    lod: if True, the geometry is first simplified to a tolerance of half
+         a pixel (see util.geom_lod)
+
     Returns
     =======
 
@@ -111,10 +132,14 @@ def geom_to_picture(geom, filename, xrange=None, yrange=None, axis_visible=True,
     isinteractive = pyplot.isinteractive()
     if isinteractive:
         pyplot.ioff()
-    fig = geom_to_fig(geom, xrange=xrange, yrange=yrange,
+    geom, xrange, yrange = _select_scene(geom, xrange, yrange)
+    x0, y0, x1, y1 = util.geom_getbounds(geom, xrange, yrange)
+    if lod and not isinstance(geom, GeometryArray):
+        geom, removed = util.geom_lod(geom, pixratio)
+        logger.debug("lod: removed %d vertices", removed)
+    fig = geom_to_fig(geom, xrange=(x0, x1), yrange=(y0, y1),
                       axis_visible=axis_visible, patchkws=patchkws)
     # ax = fig.gca()
-    x0, y0, x1, y1 = util.geom_getbounds(geom, xrange, yrange)
     xsize = (x1 - x0) * pixratio
     if dpi is None:
         dpi = 200 * xsize / 1128.
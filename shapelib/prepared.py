@@ -0,0 +1,196 @@
+"""
+Prepared shapes: a geometry together with the derived data needed
+to query it repeatedly (angles, nearest points, perpendiculars)
+"""
+from __future__ import absolute_import
+from functools import cached_property
+
+import numpy as np
+from shapely.geometry import LineString, Point
+from shapely.prepared import prep
+
+from . import util
+from .core import (
+    _normalize_point, _line_index, _tangent_angle, _nearest_on_segments,
+    _perpendicular, _exterior, edge
+)
+
+
+class PreparedShape(object):
+    """
+    A geometry with cached query structures
+
+    All the derived data (the edge, the exteriors, the segments, the
+    cumulative-length indices of the edges, a shapely prepared geometry and
+    a STRtree over the segments) is built lazily on first use and then
+    reused by every query. Use it instead of the functions in core when
+    querying the same geometry many times
+
+    Example
+    =======
+
+    >>> from shapelib import circle
+    >>> wall = PreparedShape(circle(0, 0, 1))
+    >>> wall.nearest_point((2, 0)).wkt
+    'POINT (1 0)'
+    """
+    # below this number of segments a linear scan is faster than the STRtree
+    mintreesize = 256
+
+    def __init__(self, geom):
+        self.geom = geom
+
+    @cached_property
+    def parts(self):
+        """
+        the parts of the geometry (the geometry itself if it has only one)
+        """
+        return list(self.geom.geoms) if hasattr(self.geom, 'geoms') else [self.geom]
+
+    @cached_property
+    def edge(self):
+        """
+        the edge of the geometry (see core.edge), as a line. For a
+        multi-part geometry this is a multi-part geometry
+        """
+        return _exterior(edge(self.geom))
+
+    @cached_property
+    def edge_parts(self):
+        """
+        (part, line, index) for each part of the edge, where line is the
+        edge of the part and index its cumulative-length index, used by
+        angle_at
+        """
+        if not hasattr(self.edge, 'geoms'):
+            return [(self.edge, self.edge, _line_index(self.edge))]
+        out = []
+        for part in self.edge.geoms:
+            line = _exterior(edge(part))
+            out.append((part, line, _line_index(line)))
+        return out
+
+    @cached_property
+    def exteriors(self):
+        """
+        the exterior rings of all the polygons of the geometry
+        (the lines themselves for lineal geometries)
+        """
+        return [_exterior(part) for part in self.parts]
+
+    @cached_property
+    def exterior_indices(self):
+        """
+        the cumulative-length index of each exterior, used by line_angle_at
+        """
+        return [_line_index(line) for line in self.exteriors]
+
+    @cached_property
+    def segments(self):
+        """
+        array of shape (numsegments, 4) with the segments (x0, y0, x1, y1)
+        of all the rings and lines (see util.geom_segments)
+        """
+        return util.geom_segments(self.geom)
+
+    @cached_property
+    def prepared(self):
+        """
+        a shapely prepared geometry
+        """
+        return prep(self.geom)
+
+    @cached_property
+    def _segment_geoms(self):
+        return [LineString([(x0, y0), (x1, y1)]) for x0, y0, x1, y1 in self.segments]
+
+    @cached_property
+    def strtree(self):
+        """
+        a shapely STRtree over the segments
+        """
+        from shapely.strtree import STRtree
+        return STRtree(self._segment_geoms)
+
+    @cached_property
+    def _segment_ids(self):
+        return {id(g): i for i, g in enumerate(self._segment_geoms)}
+
+    def _tree_indices(self, result):
+        # shapely < 2 returns geometries, shapely >= 2 returns indices
+        if isinstance(result, np.ndarray):
+            return result.astype(np.int64).ravel()
+        if not isinstance(result, (list, tuple)):
+            result = [result]
+        ids = self._segment_ids
+        return np.array([ids[id(g)] for g in result], dtype=np.int64)
+
+    def nearest_segment(self, point):
+        """
+        the index of the segment nearest to `point`, found with the
+        STRtree (or with a linear scan for small geometries)
+        """
+        if len(self.segments) <= self.mintreesize:
+            _, _, i = _nearest_on_segments(self.segments, point.x, point.y)
+            return i
+        return int(self._tree_indices(self.strtree.nearest(point))[0])
+
+    def contains(self, point):
+        """
+        True if `point` is contained in the geometry
+        """
+        if not isinstance(point, Point):
+            point = Point(*_normalize_point(point))
+        return self.prepared.contains(point)
+
+    def intersects(self, other):
+        """
+        True if `other` intersects the geometry
+        """
+        return self.prepared.intersects(other)
+
+    def nearest_point(self, point):
+        """
+        same as core.nearest_point(geom, point)
+        """
+        if not isinstance(point, Point):
+            point = Point(*_normalize_point(point))
+        if self.prepared.contains(point):
+            return point
+        if len(self.segments) == 0:
+            raise ValueError("geometry is empty")
+        i = self.nearest_segment(point)
+        qx, qy, _ = _nearest_on_segments(self.segments[i:i+1], point.x, point.y)
+        return Point(qx, qy)
+
+    def angle_at(self, point):
+        """
+        same as core.angle_at(geom, point)
+        """
+        if not isinstance(point, Point):
+            point = Point(*_normalize_point(point))
+        parts = self.edge_parts
+        if len(parts) == 1:
+            _, line, index = parts[0]
+        else:
+            # as core.angle_at, the angle at the edge of the nearest part
+            _, line, index = min(parts, key=lambda part: part[0].distance(point))
+        return _tangent_angle(index, line.project(point))
+
+    def line_angle_at(self, point):
+        """
+        same as core.line_angle_at(geom, point), for lines and rings
+        (for multi-part geometries, the nearest part)
+        """
+        point = Point(*_normalize_point(point))
+        i = 0
+        if len(self.parts) > 1:
+            i = min(range(len(self.parts)), key=lambda i: self.parts[i].distance(point))
+        return _tangent_angle(self.exterior_indices[i], self.exteriors[i].project(point))
+
+    def perpendicular_at(self, point, length):
+        """
+        same as core.perpendicular_at(geom, point, length), for lines and rings
+        """
+        point = Point(*_normalize_point(point))
+        return _perpendicular(point, self.line_angle_at(point), length)
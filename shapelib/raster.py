@@ -5,17 +5,372 @@
 ###########################################
 from __future__ import print_function
 from __future__ import absolute_import
+import logging
 import numpy as np
 from collections import namedtuple as _namedtuple
 from numbers import Number as _Number
-import tempfile
+from . import util
+from .mask import PackedMask, RLEMask
+from .scene import Scene
+from .geometryarray import GeometryArray, _POLYGON
 import os
+import tempfile
+from shapely.geometry import box as _box, GeometryCollection
+from shapely.topology import TopologicalError as _TopologicalError
+
+logger = logging.getLogger(__name__)
+
+
+def _rastershape(x0, y0, x1, y1, pixratio):
+    """
+    the shape (rows, cols) of the raster covering the given bounds
+    """
+    cols = int(abs(x1-x0) * pixratio + 0.5)
+    rows = int(abs(y1-y0) * pixratio + 0.5)
+    return rows, cols
+
+
+def _iter_polygons(geom, pixratio, buffer_lines=True):
+    """
+    iterate over the polygons of `geom`. Geometries without area
+    (points, lines, rings) are buffered by half a pixel, so that
+    they are rendered one pixel wide, or skipped if buffer_lines is False
+    """
+    geomtype = geom.geom_type
+    if geomtype == 'Polygon':
+        if not geom.is_empty:
+            yield geom
+    elif hasattr(geom, 'geoms'):
+        for sub in geom.geoms:
+            for poly in _iter_polygons(sub, pixratio, buffer_lines):
+                yield poly
+    elif not geom.is_empty and buffer_lines:
+        for poly in _iter_polygons(geom.buffer(0.5 / pixratio), pixratio):
+            yield poly
+
+
+def _polygon_edges(garray):
+    """
+    the edges of the rings of the polygons of a GeometryArray, in the
+    coordinates of the geometry, and the index of the polygon (among
+    the polygon parts) each edge belongs to
+    """
+    coords, ringoffsets, ringgroups = garray.polygon_rings()
+    ringids = np.repeat(np.arange(len(ringgroups)), np.diff(ringoffsets))
+    valid = np.flatnonzero(ringids[:-1] == ringids[1:])
+    edges = np.concatenate([coords[valid], coords[valid + 1]], axis=1)
+    return edges, ringgroups[ringids[valid]]
+
+
+def _geom_edges(geom, pixratio, buffer_lines=True):
+    """
+    the edges of all the rings of `geom`, in the coordinates of the
+    geometry. pixratio is only used to buffer geometries without area
+    (see _iter_polygons)
+
+    Returns
+    =======
+
+    (edges, groups) where:
+
+        edges:  array of shape (numedges, 4), each row is (x0, y0, x1, y1)
+        groups: array of shape (numedges,), the index of the polygon
+                each edge belongs to
+    """
+    edges = []
+    groups = []
+    numgroups = 0
+    if isinstance(geom, GeometryArray):
+        # the edges are read directly from the coordinates of the polygons,
+        # only the parts without area are converted to shapely (and buffered)
+        polyedges, polygroups = _polygon_edges(geom)
+        edges.append(polyedges)
+        groups.append(polygroups)
+        numgroups = len(polygroups) and int(polygroups.max()) + 1
+        geom = GeometryCollection(geom.nonpolygon_parts())
+    for i, poly in enumerate(_iter_polygons(geom, pixratio, buffer_lines), numgroups):
+        for ring in [poly.exterior] + list(poly.interiors):
+            coords = np.asarray(ring.coords)[:, :2]
+            if len(coords) < 2:
+                continue
+            e = np.empty((len(coords) - 1, 4), dtype=float)
+            e[:, 0:2] = coords[:-1]
+            e[:, 2:4] = coords[1:]
+            edges.append(e)
+            groups.append(np.full(len(e), i, dtype=np.int64))
+    if not edges:
+        return np.empty((0, 4), dtype=float), np.empty((0,), dtype=np.int64)
+    return np.concatenate(edges), np.concatenate(groups)
+
+
+def _pixel_edges(geom, pixratio, x0, y0, rows, buffer_lines=True):
+    """
+    the edges of all the rings of `geom`, in pixel coordinates
+
+    pixel coordinates: u grows to the right from x0, v grows downwards
+    from the top of the raster, so that row i has its center at v = i + 0.5
+
+    Returns
+    =======
+
+    (edges, groups) where:
+
+        edges:  array of shape (numedges, 4), each row is (u0, v0, u1, v1)
+        groups: array of shape (numedges,), the index of the polygon
+                each edge belongs to
+    """
+    edges, groups = _geom_edges(geom, pixratio, buffer_lines)
+    return _to_pixels(edges, pixratio, x0, y0, rows), groups
+
+
+def _to_pixels(edges, pixratio, x0, y0, rows):
+    """
+    convert edges (x0, y0, x1, y1) in place to pixel coordinates
+    (see _pixel_edges)
+    """
+    if len(edges) == 0:
+        return edges
+    edges[:, 0::2] -= x0
+    edges[:, 0::2] *= pixratio
+    edges[:, 1::2] -= y0
+    edges[:, 1::2] *= -pixratio
+    edges[:, 1::2] += rows
+    return edges
+
+
+def _scanline_spans(edges, groups, row0, row1, col0, col1):
+    """
+    even-odd scanline fill of the edges (in pixel coordinates, see
+    _pixel_edges), restricted to the window rows [row0, row1),
+    cols [col0, col1)
+
+    A pixel is inside if its center is inside. Each polygon (group)
+    is filled with the even-odd rule, the polygons are then merged.
+
+    Returns
+    =======
+
+    (rows, starts, ends): the disjoint spans [start, end) of each row
+    which are inside the geometry, in absolute pixel coordinates
+    """
+    empty = np.empty((0,), dtype=np.int64)
+    if len(edges) == 0:
+        return empty, empty, empty
+    u0, v0, u1, v1 = edges.T
+    swap = v0 > v1
+    ua = np.where(swap, u1, u0)
+    va = np.where(swap, v1, v0)
+    ub = np.where(swap, u0, u1)
+    vb = np.where(swap, v0, v1)
+    # an edge crosses the scanline at the center of row i if va <= i+0.5 < vb
+    r0 = np.clip(np.ceil(va - 0.5), row0, row1).astype(np.int64)
+    r1 = np.clip(np.ceil(vb - 0.5), row0, row1).astype(np.int64)
+    counts = r1 - r0
+    active = counts > 0
+    if not active.any():
+        return empty, empty, empty
+    ua, va, ub, vb = ua[active], va[active], ub[active], vb[active]
+    r0, counts, groups = r0[active], counts[active], groups[active]
+    # expand the edge table to one entry per crossing
+    idx = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.cumsum(counts) - counts
+    rows = np.arange(len(idx)) - offsets[idx] + r0[idx]
+    slope = (ub - ua) / (vb - va)
+    xs = ua[idx] + (rows + 0.5 - va[idx]) * slope[idx]
+    # a crossing at xs toggles every pixel whose center lies to its right
+    cols = np.clip(np.ceil(xs - 0.5), col0, col1).astype(np.int64)
+    order = np.lexsort((cols, rows, groups[idx]))
+    rows = rows[order][0::2]
+    starts = cols[order][0::2]
+    ends = cols[order][1::2]
+    nonempty = starts < ends
+    rows, starts, ends = rows[nonempty], starts[nonempty], ends[nonempty]
+    if len(rows) == 0:
+        return rows, starts, ends
+    # merge overlapping or adjacent spans, so that they are disjoint
+    width = col1 + 1
+    s = rows * width + starts
+    e = rows * width + ends
+    # the spans are sorted by group first, and the edges of a group
+    # are not necessarily contiguous (see iter_rasterize)
+    if np.any(s[1:] < s[:-1]):
+        order = np.argsort(s, kind='stable')
+        s, e = s[order], e[order]
+    emax = np.maximum.accumulate(e)
+    new = np.empty(len(s), dtype=bool)
+    new[0] = True
+    new[1:] = s[1:] > emax[:-1]
+    heads = np.flatnonzero(new)
+    s = s[heads]
+    e = np.maximum.reduceat(e, heads)
+    rows = s // width
+    return rows, s - rows * width, e - rows * width
+
+
+def _fill_spans(out, rows, starts, ends, row0=0, col0=0):
+    """
+    fill `out` with the spans returned by _scanline_spans. `out`
+    represents the window starting at (row0, col0)
+    """
+    out[...] = 0
+    if len(rows) == 0:
+        return out
+    rows = rows - row0
+    ncols = out.shape[1]
+    out[rows, starts - col0] = 1
+    inside = ends - col0 < ncols
+    out[rows[inside], ends[inside] - col0] = 1
+    np.bitwise_xor.accumulate(out, axis=1, out=out)
+    return out
+
+
+def _save_mask(array, imageout):
+    """
+    save a 0-1 mask as a monochrome image (black on white)
+    """
+    from matplotlib import image
+    image.imsave(imageout, array, cmap='gray_r', vmin=0, vmax=1)
+    return imageout
+
+
+def _rasterize_numpy(geom, pixratio, xrange=None, yrange=None, imageout=None):
+    """
+    rasterize `geom` to a 2D array
+
+    Pure numpy even-odd scanline fill, computed directly from the
+    coordinates of the exterior and interior rings. A pixel is set
+    if its center lies inside the geometry
+
+    NB: (0, 0) is left upper corner
+    """
+    x0, y0, x1, y1 = _geomselectrange(geom, xrange, yrange)
+    rows, cols = _rastershape(x0, y0, x1, y1, pixratio)
+    edges, groups = _pixel_edges(geom, pixratio, x0, y0, rows)
+    array = np.empty((rows, cols), dtype=np.uint8)
+    _fill_spans(array, *_scanline_spans(edges, groups, 0, rows, 0, cols))
+    if imageout:
+        imageout = _save_mask(array, imageout)
+    return _rasterize_out(array, imageout)
+
+
+def _tiles(rows, cols, tilesize):
+    """
+    iterate over the windows (row0, row1, col0, col1) of the tiles
+    covering a raster of the given shape
+    """
+    for row0 in range(0, rows, tilesize):
+        for col0 in range(0, cols, tilesize):
+            yield row0, min(row0 + tilesize, rows), col0, min(col0 + tilesize, cols)
+
+
+def _clip_to_window(geom, pixratio, x0, y0, rows, row0, row1, col0, col1):
+    """
+    clip `geom` to the world coordinates of the given pixel window,
+    expanded by one pixel so that the pixels of the window are not
+    affected by the clipping. Returns None if nothing is left
+    """
+    px = 1.0 / pixratio
+    window = _box(x0 + (col0 - 1) * px, y0 + (rows - row1 - 1) * px,
+                  x0 + (col1 + 1) * px, y0 + (rows - row0 + 1) * px)
+    try:
+        clipped = geom.intersection(window)
+    except _TopologicalError:
+        # the edges outside of the window are discarded by the scanline anyway
+        return geom
+    if clipped.is_empty:
+        return None
+    return clipped
+
+
+def _tile_edges(garray, pixratio, x0, y0, rows, cols, tilesize):
+    """
+    iterate over the tiles of a GeometryArray as (window, edges, groups).
+    Arrays are not clipped: their edges (in pixel coordinates) are computed
+    once and each tile gets the ones crossing its rows
+    """
+    edges, groups = _pixel_edges(garray, pixratio, x0, y0, rows)
+    vmin = np.minimum(edges[:, 1], edges[:, 3])
+    vmax = np.maximum(edges[:, 1], edges[:, 3])
+    for window in _tiles(rows, cols, tilesize):
+        row0, row1 = window[:2]
+        crossing = (vmax >= row0) & (vmin <= row1)
+        yield window, edges[crossing], groups[crossing]
+
+
+def _rasterize_window(geom, pixratio, x0, y0, rows, row0, row1, col0, col1, out):
+    """
+    rasterize the window [row0:row1, col0:col1] of the raster with origin
+    (x0, y0) and `rows` rows into `out`. Only the part of `geom` within the
+    window is processed. The result is identical to the same window of
+    a full rasterization.
+    """
+    clipped = _clip_to_window(geom, pixratio, x0, y0, rows, row0, row1, col0, col1)
+    if clipped is None:
+        out[...] = 0
+        return out
+    return _fill_window(clipped, pixratio, x0, y0, rows, row0, row1, col0, col1, out)
+
+
+def _fill_window(geom, pixratio, x0, y0, rows, row0, row1, col0, col1, out):
+    """
+    like _rasterize_window, but `geom` is used as is, without clipping
+    """
+    edges, groups = _pixel_edges(geom, pixratio, x0, y0, rows)
+    spans = _scanline_spans(edges, groups, row0, row1, col0, col1)
+    return _fill_spans(out, *spans, row0=row0, col0=col0)
+
+
+def _geom_to_path(geom, pixratio):
+    """
+    convert `geom` to a matplotlib Path, with exteriors oriented
+    counter-clockwise and interiors clockwise, so that it can be filled
+    with the nonzero rule
+    """
+    from matplotlib.path import Path
+    from shapely.geometry.polygon import orient
+    vertices = []
+    codes = []
+    if isinstance(geom, GeometryArray):
+        coords, ringoffsets, ringgroups = geom.polygon_rings()
+        if len(ringgroups):
+            ringids = np.repeat(np.arange(len(ringgroups)), np.diff(ringoffsets))
+            # twice the signed area of each ring (positive = counter-clockwise)
+            cross = coords[:-1, 0] * coords[1:, 1] - coords[1:, 0] * coords[:-1, 1]
+            valid = ringids[:-1] == ringids[1:]
+            area = np.bincount(ringids[:-1][valid], weights=cross[valid],
+                               minlength=len(ringgroups))
+            exterior = np.concatenate([[True], ringgroups[1:] != ringgroups[:-1]])
+            flip = ((area > 0) != exterior)[ringids]
+            idx = np.arange(len(coords))
+            start, end = ringoffsets[ringids], ringoffsets[ringids + 1]
+            vertices.append(coords[np.where(flip, start + end - 1 - idx, idx)])
+            ringcodes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+            ringcodes[ringoffsets[:-1][np.diff(ringoffsets) > 0]] = Path.MOVETO
+            ringcodes[ringoffsets[1:][np.diff(ringoffsets) > 0] - 1] = Path.CLOSEPOLY
+            codes.append(ringcodes)
+        geom = GeometryCollection(geom.nonpolygon_parts())
+    for poly in _iter_polygons(geom, pixratio):
+        poly = orient(poly, 1.0)
+        for ring in [poly.exterior] + list(poly.interiors):
+            coords = np.asarray(ring.coords)[:, :2]
+            ringcodes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+            ringcodes[0] = Path.MOVETO
+            ringcodes[-1] = Path.CLOSEPOLY
+            vertices.append(coords)
+            codes.append(ringcodes)
+    if not vertices:
+        return None
+    return Path(np.concatenate(vertices), np.concatenate(codes))
+
 
 def _rasterize_matplotlib(geom, pixratio, xrange=None, yrange=None, imageout=None):
     """
     rasterize `geom` to a 2D array
 
-    Uses matplotlibs image rendering
+    Uses matplotlibs Agg renderer: the geometry is drawn in memory onto
+    a canvas of exactly cols x rows pixels, without axes or margins, and
+    the pixels are read back from the canvas buffer. An image is only
+    written if `imageout` is given
 
     NB: (0, 0) is left upper corner
 
@@ -24,52 +379,79 @@ def _rasterize_matplotlib(geom, pixratio, xrange=None, yrange=None, imageout=Non
 
     (array, imageout) or None if the backend is not available
     """
-    
     try:
-        from matplotlib import image
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.patches import PathPatch
     except ImportError:
         return None
-    if imageout:
-        filename = os.path.splitext(imageout)[0] + '.png'
-        remove = False
-    else:
-        filename = tempfile.mktemp(suffix='.png')
-        remove = True
     x0, y0, x1, y1 = _geomselectrange(geom, xrange, yrange)
-    # cols = int(abs(x1-x0) * pixratio + 0.5)
-    # rows = int(abs(y1-y0) * pixratio + 0.5)
-    # save it to a black figure on white canvas
-    geom_to_picture(geom, filename=filename, xrange=xrange, yrange=yrange,
-                    pixratio=pixratio, patchkws={'color':'#000000'}, axis_visible=False)
-    im = (image.imread(filename)[:, :, 0] < 0.9).astype(float)
-    im = np.flipud(im)
-    if remove:
-        os.remove(filename)
-        filename = None
-    im = im.astype(np.uint8)
-    return _rasterize_out(im, filename)
+    rows, cols = _rastershape(x0, y0, x1, y1, pixratio)
+    # with dpi=1 the size of the figure in inches is its size in pixels
+    fig = Figure(figsize=(cols, rows), dpi=1, facecolor='white')
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.axis('off')
+    ax.set_xlim(x0, x0 + cols / pixratio)
+    ax.set_ylim(y0, y0 + rows / pixratio)
+    path = _geom_to_path(geom, pixratio)
+    if path is not None:
+        ax.add_patch(PathPatch(path, facecolor='black', edgecolor='none',
+                               linewidth=0, antialiased=False, snap=False))
+    canvas.draw()
+    buf = np.asarray(canvas.buffer_rgba())
+    assert buf.shape[:2] == (rows, cols)
+    array = (buf[:, :, 0] < 128).astype(np.uint8)
+    if imageout:
+        imageout = os.path.splitext(imageout)[0] + '.png'
+        canvas.print_png(imageout)
+    return _rasterize_out(array, imageout)
 
 
-def geom_to_picture(geom, filename, xrange, yrange, pixratio, patchkws, axis_visible):
-    pass
+def _geomselectrange(geom, xr, yr):
+    return _boundsselectrange(geom.bounds, xr, yr)
 
 
-def _geomselectrange(geom, xr, yr):
-    x0, y0, x1, y1 = geom.bounds
+def _boundsselectrange(bounds, xr, yr):
+    # an empty geometry has no bounds, both ranges should be given
+    x0, y0, x1, y1 = bounds if bounds else (None,) * 4
     
     def override(c0, c1, r):
         if r is not None:
             if isinstance(r, _Number):
-                c1 = min(c1, r)
+                c1 = r if c1 is None else min(c1, r)
             else:
                 c0, c1 = r
         return c0, c1
     
     x0, x1 = override(x0, x1, xr)
     y0, y1 = override(y0, y1, yr)
+    if None in (x0, y0, x1, y1):
+        raise ValueError("the geometry is empty, xrange and yrange should be "
+                         "given as (start, end)")
     return x0, y0, x1, y1
 
 
+def _select_scene(geom, xrange, yrange):
+    """
+    for a Scene, the geometries within the ranges, clipped to them, and
+    the ranges fixed to the bounds of the whole scene, so that the extent
+    of the raster does not depend on what is selected. Any other geometry
+    is returned as is
+
+    Returns
+    =======
+
+    (geom, xrange, yrange)
+    """
+    if not isinstance(geom, Scene):
+        return geom, xrange, yrange
+    x0, y0, x1, y1 = util.geom_getbounds(geom, xrange, yrange)
+    if xrange is None and yrange is None:
+        return geom.geometry(), (x0, x1), (y0, y1)
+    return geom.clip((x0, y0, x1, y1)), (x0, x1), (y0, y1)
+
+
 def _rasterize_rasterio(geom, pixratio, xrange=None, yrange=None, imageout=None):
     """
     rasterize `geom` to a 2D array
@@ -87,7 +469,7 @@ def _rasterize_rasterio(geom, pixratio, xrange=None, yrange=None, imageout=None)
     rows = int(abs(y1-y0) * pixratio + 0.5)
     transform = [0, 1.0/pixratio, 0, 0, 0, 1.0/pixratio]
     foreground = 'white'
-    print("cols: {cols}, rows: {rows}".format(**locals()))
+    logger.debug("cols: %d, rows: %d", cols, rows)
     with rasterio.drivers():
         array = features.rasterize(geoms, out_shape=(rows, cols), transform=transform)
         array_uint8 = array.astype(np.uint8)
@@ -112,11 +494,73 @@ def _rasterize_rasterio(geom, pixratio, xrange=None, yrange=None, imageout=None)
     return _rasterize_out(array_uint8, imageout)
 
 _rasterize_out = _namedtuple("rasterize", "array imageout")
-def rasterize(geom, pixratio, xrange=None, yrange=None, imageout=None):
+
+_backends = [
+    ('rasterio', _rasterize_rasterio),
+    ('numpy', _rasterize_numpy),
+    ('matplotlib', _rasterize_matplotlib)
+]
+
+
+def _backend_available(name):
+    """
+    True if the modules needed by the given backend can be imported
+    """
+    import importlib.util
+    modules = {'rasterio': 'rasterio', 'numpy': 'numpy', 'matplotlib': 'matplotlib'}
+    return importlib.util.find_spec(modules[name]) is not None
+
+
+def _apply_lod(geom, pixratio, xrange, yrange):
+    """
+    simplify `geom` to half a pixel (see util.geom_lod). The ranges are
+    fixed to the bounds of the original geometry, so that the extent of
+    the raster does not depend on the simplification. A GeometryArray
+    is not simplified. The number of removed vertices is logged at debug
+    level (see util.geom_lod to get it as a value)
+
+    Returns
+    =======
+
+    (geom, xrange, yrange)
+    """
+    x0, y0, x1, y1 = _geomselectrange(geom, xrange, yrange)
+    if isinstance(geom, GeometryArray):
+        # arrays are rasterized from their coordinates, as they are
+        return geom, (x0, x1), (y0, y1)
+    geom, removed = util.geom_lod(geom, pixratio)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("lod: removed %d vertices", removed)
+    return geom, (x0, x1), (y0, y1)
+
+
+def _rasterize_compact(geom, pixratio, xrange, yrange, imageout, output):
+    """
+    rasterize to a PackedMask or a RLEMask, directly from the scanline
+    spans, without a dense array
+    """
+    x0, y0, x1, y1 = _geomselectrange(geom, xrange, yrange)
+    rows, cols = _rastershape(x0, y0, x1, y1, pixratio)
+    edges, groups = _pixel_edges(geom, pixratio, x0, y0, rows)
+    spans = _scanline_spans(edges, groups, 0, rows, 0, cols)
+    if output == 'packed':
+        mask = PackedMask.from_spans((rows, cols), *spans)
+    else:
+        mask = RLEMask.from_spans((rows, cols), *spans)
+    if imageout:
+        imageout = _save_mask(mask.to_dense(), imageout)
+    return _rasterize_out(mask, imageout)
+
+
+def rasterize(geom, pixratio, xrange=None, yrange=None, imageout=None, backend=None,
+              cache=None, output='dense', lod=True):
     """
     rasterize the geometry
 
-    geom: a shapely geometry
+    geom: a shapely geometry, or a Scene (only the geometries within
+          the selected ranges are rasterized, the ranges default to the
+          bounds of the whole scene), or a GeometryArray (its
+          coordinates are read directly, lod and cache are not applied)
     pixratio: how many pixels pro unit
               x_pixels / x_size
     xrange, yrange: a selection of the geometry to be rendered,
@@ -124,9 +568,23 @@ def rasterize(geom, pixratio, xrange=None, yrange=None, imageout=None):
                     the geometry itself.
     imageout: if given, it should be the path to save
               the rasterized geometry as a monochrome image
+    backend: the name of the backend to use, or None to use the
+             first available one
+    cache: a RasterCache. If given (and imageout is not), the result is
+           looked up in the cache and stored there after rasterizing.
+           Cached arrays are returned as read-only memory maps
+    output: 'dense': a 2D uint8 array
+            'packed': a PackedMask (1 bit per pixel)
+            'rle': a RLEMask (runs of set pixels per row)
+            Compact outputs are always produced by the numpy scanline,
+            without allocating a dense array, and are not cached
+    lod: if True, the geometry is first simplified to a tolerance of half
+         a pixel (see util.geom_lod), which removes the vertices below the
+         resolution of the raster. Geometries whose vertices are sparser
+         than that are used as they are. The extent is not affected
 
     Backends:
-        rasterio, matplotlib
+        rasterio, numpy, matplotlib
 
     Returns
     =======
@@ -134,19 +592,1025 @@ def rasterize(geom, pixratio, xrange=None, yrange=None, imageout=None):
     namedtup(array, imageout) where: 
 
         array:    2D array of rasterized values, uint8, 0-1
+                  (or a PackedMask / RLEMask, see `output`)
         imageout: filename of generated image or None
     """
-    backends = [
-        ('rasterio', _rasterize_rasterio),
-        ('mastplotlib', _rasterize_matplotlib)
-    ]
-
+    geom, xrange, yrange = _select_scene(geom, xrange, yrange)
+    if isinstance(geom, GeometryArray):
+        # rasterized directly from its coordinates, without simplifying
+        lod = False
+        cache = None
+    outputs = ('dense', 'packed', 'rle')
+    if output not in outputs:
+        raise ValueError("output should be one of {0}, got {1}".format(outputs, output))
+    if output != 'dense':
+        if lod:
+            geom, xrange, yrange = _apply_lod(geom, pixratio, xrange, yrange)
+        return _rasterize_compact(geom, pixratio, xrange, yrange, imageout, output)
+    if backend is not None:
+        backends = [(name, func) for name, func in _backends if name == backend]
+        if not backends:
+            raise ValueError("backend should be one of {0}".format(
+                [name for name, _ in _backends]))
+    else:
+        backends = _backends
+    if cache is not None and not imageout:
+        backends = [(name, func) for name, func in backends if _backend_available(name)][:1]
+        if backends:
+            key = cache.key(geom, pixratio, xrange, yrange, backends[0][0], lod)
+            array = cache.get(key)
+            if array is not None:
+                return _rasterize_out(array, None)
+            out = rasterize(geom, pixratio, xrange, yrange, backend=backends[0][0], lod=lod)
+            cache.put(key, out.array)
+            return out
+    if lod:
+        geom, xrange, yrange = _apply_lod(geom, pixratio, xrange, yrange)
     for backendname, func in backends:
         out = func(geom, pixratio, xrange, yrange, imageout=imageout)
         if out:
-            print("using backend: {backendname}".format(**locals()))
+            logger.debug("using backend: %s", backendname)
             return out
+    raise ImportError("backend {0} is not available".format(backend))
 
 def geom_to_array(geom, pixratio, xrange=None, yrange=None):
     print("deprecated, use rasterize")
     return rasterize(geom, pixratio, xrange, yrange)
+
+
+def rasterize_tiled(geom, pixratio, xrange=None, yrange=None, tilesize=1024,
+                    out=None, filename=None, lod=True):
+    """
+    rasterize the geometry tile by tile into a memory-mapped array
+
+    Each tile is rasterized with the numpy backend from the part of the
+    geometry within the tile, so peak memory is bounded by the tile size
+    and not by the size of the output. The result is identical to
+    rasterize(geom, pixratio, xrange, yrange, backend='numpy', lod=lod)
+
+    geom, pixratio, xrange, yrange, lod: see `rasterize`
+    tilesize: the size in pixels of the side of each tile
+    out: a writable uint8 array of shape (rows, cols) to rasterize into.
+         If not given, a numpy.memmap is created
+    filename: the file backing the memmap, if `out` is not given.
+              If None, an anonymous temporary file is used
+
+    Returns
+    =======
+
+    namedtup(array, imageout) where:
+
+        array:    `out` or a numpy.memmap, uint8, 0-1
+        imageout: always None
+    """
+    geom, xrange, yrange = _select_scene(geom, xrange, yrange)
+    if lod:
+        geom, xrange, yrange = _apply_lod(geom, pixratio, xrange, yrange)
+    x0, y0, x1, y1 = _geomselectrange(geom, xrange, yrange)
+    rows, cols = _rastershape(x0, y0, x1, y1, pixratio)
+    if out is None:
+        if filename is None:
+            filename = tempfile.TemporaryFile()
+        out = np.memmap(filename, dtype=np.uint8, mode='w+', shape=(rows, cols))
+    elif out.shape != (rows, cols):
+        raise ValueError("out should have a shape {0}, got {1}".format(
+            (rows, cols), out.shape))
+    buf = np.empty((min(tilesize, rows), min(tilesize, cols)), dtype=np.uint8)
+    if isinstance(geom, GeometryArray):
+        for (row0, row1, col0, col1), edges, groups in _tile_edges(
+                geom, pixratio, x0, y0, rows, cols, tilesize):
+            tile = buf[:row1-row0, :col1-col0]
+            spans = _scanline_spans(edges, groups, row0, row1, col0, col1)
+            _fill_spans(tile, *spans, row0=row0, col0=col0)
+            out[row0:row1, col0:col1] = tile
+    else:
+        for row0, row1, col0, col1 in _tiles(rows, cols, tilesize):
+            tile = buf[:row1-row0, :col1-col0]
+            _rasterize_window(geom, pixratio, x0, y0, rows, row0, row1, col0, col1,
+                              out=tile)
+            out[row0:row1, col0:col1] = tile
+    if isinstance(out, np.memmap):
+        out.flush()
+    return _rasterize_out(out, None)
+
+
+def _rasterize_tile_worker(args):
+    """
+    rasterize one tile into the shared output array (runs in a worker process)
+    """
+    from shapely import wkb
+    from multiprocessing import shared_memory
+    geomdata, pixratio, x0, y0, rows, cols, window, shmname = args
+    row0, row1, col0, col1 = window
+    shm = shared_memory.SharedMemory(name=shmname)
+    try:
+        out = np.ndarray((rows, cols), dtype=np.uint8, buffer=shm.buf)
+        tile = out[row0:row1, col0:col1]
+        if isinstance(geomdata, tuple):
+            # the pixel edges crossing the tile (see _tile_edges)
+            spans = _scanline_spans(geomdata[0], geomdata[1], row0, row1, col0, col1)
+            _fill_spans(tile, *spans, row0=row0, col0=col0)
+        else:
+            _fill_window(wkb.loads(geomdata), pixratio, x0, y0, rows, row0, row1, col0,
+                         col1, out=tile)
+        del out, tile
+    finally:
+        shm.close()
+    return window
+
+
+def rasterize_parallel(geom, pixratio, xrange=None, yrange=None, workers=None,
+                       tilesize=1024, lod=True):
+    """
+    rasterize the geometry using a pool of processes
+
+    The extent is split in tiles of tilesize x tilesize pixels. Each worker
+    receives the part of the geometry within its tile (as WKB, or for a
+    GeometryArray the edges crossing the tile) and writes it into an
+    output array in shared memory. The result is identical to
+    rasterize(geom, pixratio, xrange, yrange, backend='numpy', lod=lod)
+
+    geom, pixratio, xrange, yrange, lod: see `rasterize`. To rasterize many
+        geometries at once, pass them as a GeometryCollection
+    workers: the number of processes, or None to use one per cpu
+    tilesize: the size in pixels of the side of each tile
+
+    Returns
+    =======
+
+    namedtup(array, imageout) where:
+
+        array:    2D array of rasterized values, uint8, 0-1
+        imageout: always None
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+    geom, xrange, yrange = _select_scene(geom, xrange, yrange)
+    if lod:
+        geom, xrange, yrange = _apply_lod(geom, pixratio, xrange, yrange)
+    x0, y0, x1, y1 = _geomselectrange(geom, xrange, yrange)
+    rows, cols = _rastershape(x0, y0, x1, y1, pixratio)
+    tasks = []
+    shm = shared_memory.SharedMemory(create=True, size=max(rows * cols, 1))
+    try:
+        out = np.ndarray((rows, cols), dtype=np.uint8, buffer=shm.buf)
+        out[...] = 0
+        if isinstance(geom, GeometryArray):
+            for window, edges, groups in _tile_edges(geom, pixratio, x0, y0, rows, cols,
+                                                     tilesize):
+                if len(edges):
+                    tasks.append(((edges, groups), pixratio, x0, y0, rows, cols, window,
+                                  shm.name))
+        else:
+            for window in _tiles(rows, cols, tilesize):
+                clipped = _clip_to_window(geom, pixratio, x0, y0, rows, *window)
+                if clipped is not None:
+                    tasks.append((clipped.wkb, pixratio, x0, y0, rows, cols, window,
+                                  shm.name))
+        if tasks:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for _ in pool.map(_rasterize_tile_worker, tasks):
+                    pass
+        array = out.copy()
+        del out
+    finally:
+        shm.close()
+        shm.unlink()
+    return _rasterize_out(array, None)
+
+
+def _smallest_dtype(values, fill, merge):
+    """
+    the smallest dtype which can hold the result of burning `values`
+    onto a raster filled with `fill`, using the merge rule `merge`
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'b':
+        values = values.astype(np.int64)
+    if merge == 'sum':
+        # worst case: every geometry overlaps at the same pixel
+        lo = fill + values[values < 0].sum()
+        hi = fill + values[values > 0].sum()
+    else:
+        lo = min(fill, values.min())
+        hi = max(fill, values.max())
+    if values.dtype.kind in 'iu' and float(fill).is_integer():
+        if lo >= 0:
+            return np.min_scalar_type(int(hi))
+        # a signed type whose negative range also covers hi
+        return np.min_scalar_type(min(int(lo), -int(hi) - 1))
+    candidates = np.array([lo, hi, fill], dtype=np.float64)
+    if merge != 'sum':
+        candidates = np.concatenate([candidates, values.astype(np.float64)])
+    # NaN (a nodata fill) is representable in float32
+    candidates = candidates[~np.isnan(candidates)]
+    if np.all(candidates.astype(np.float32) == candidates):
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
+
+
+def _span_indices(rows, starts, ends, cols):
+    """
+    the flat indices of all the pixels covered by the given spans
+    """
+    lengths = ends - starts
+    total = lengths.sum()
+    offsets = np.cumsum(lengths) - lengths
+    spanidx = np.repeat(np.arange(len(lengths)), lengths)
+    return (np.arange(total) - offsets[spanidx]
+            + (rows * cols + starts)[spanidx])
+
+
+def _geometry_edges(garray, pixratio, x0, y0, rows):
+    """
+    iterate over the pixel edges of each geometry of a GeometryArray,
+    as (edges, groups). The edges of the polygons are read from the
+    coordinates at once and split per geometry, only the parts without
+    area are converted to shapely (and buffered)
+    """
+    partgeoms = np.repeat(np.arange(len(garray)), np.diff(garray.geom_offsets))
+    ispolygon = garray.part_types == _POLYGON
+    edges, groups = _polygon_edges(garray)
+    _to_pixels(edges, pixratio, x0, y0, rows)
+    edgegeoms = partgeoms[ispolygon][groups]
+    order = np.argsort(edgegeoms, kind='stable')
+    edges, groups = edges[order], groups[order]
+    limits = np.searchsorted(edgegeoms[order], np.arange(len(garray) + 1))
+    others = {}
+    for j in np.flatnonzero(~ispolygon):
+        others.setdefault(partgeoms[j], []).append(j)
+    for k in range(len(garray)):
+        e, g = edges[limits[k]:limits[k+1]], groups[limits[k]:limits[k+1]]
+        if k in others:
+            parts = GeometryCollection([garray._part(j) for j in others[k]])
+            e2, g2 = _pixel_edges(parts, pixratio, x0, y0, rows)
+            e, g = np.concatenate([e, e2]), np.concatenate([g, g2 + len(ispolygon)])
+        yield e, g
+
+
+def rasterize_many(geoms, values, pixratio, xrange=None, yrange=None, merge='last',
+                   fill=0, dtype=None):
+    """
+    burn many geometries into one raster, each with its own value
+
+    geoms: a sequence of shapely geometries, or a GeometryArray
+    values: a sequence of numbers, one per geometry
+    pixratio: how many pixels pro unit
+    xrange, yrange: see `rasterize`. If not given, the bounds of all
+                    geometries are used
+    merge: what to do where geometries overlap:
+           'last': the value of the last geometry wins
+           'max', 'min': the max/min value (including `fill`)
+           'sum': the values are added
+    fill: the value of pixels not covered by any geometry
+    dtype: the dtype of the result. If not given, the smallest dtype
+           which can hold all the values (and their sum, for 'sum')
+
+    Each geometry is rasterized (numpy backend) only within its own bounds,
+    so there is one allocation of the raster and no full-size
+    intermediate masks.
+
+    Returns
+    =======
+
+    namedtup(array, imageout) where:
+
+        array:    2D array of burnt values
+        imageout: always None
+    """
+    merges = ('last', 'max', 'min', 'sum')
+    if merge not in merges:
+        raise ValueError("merge should be one of {0}, got {1}".format(merges, merge))
+    if not isinstance(geoms, GeometryArray):
+        geoms = list(geoms)
+    values = np.asarray(values)
+    if len(values) != len(geoms):
+        raise ValueError("expected one value per geometry")
+    if dtype is None:
+        dtype = _smallest_dtype(values, fill, merge) if len(geoms) else np.uint8
+    if isinstance(geoms, GeometryArray):
+        bounds = geoms.bounds or (0, 0, 0, 0)
+    else:
+        allbounds = np.array([g.bounds for g in geoms if not g.is_empty])
+        if len(allbounds):
+            bounds = (allbounds[:, 0].min(), allbounds[:, 1].min(),
+                      allbounds[:, 2].max(), allbounds[:, 3].max())
+        else:
+            bounds = (0, 0, 0, 0)
+    x0, y0, x1, y1 = _boundsselectrange(bounds, xrange, yrange)
+    rows, cols = _rastershape(x0, y0, x1, y1, pixratio)
+    out = np.full((rows, cols), fill, dtype=dtype)
+    flat = out.reshape(-1)
+    values = values.astype(dtype)
+    if isinstance(geoms, GeometryArray):
+        alledges = _geometry_edges(geoms, pixratio, x0, y0, rows)
+    else:
+        alledges = (_pixel_edges(geom, pixratio, x0, y0, rows) for geom in geoms)
+    for (edges, groups), value in zip(alledges, values):
+        spanrows, starts, ends = _scanline_spans(edges, groups, 0, rows, 0, cols)
+        if len(spanrows) == 0:
+            continue
+        idx = _span_indices(spanrows, starts, ends, cols)
+        if merge == 'last':
+            flat[idx] = value
+        elif merge == 'max':
+            flat[idx] = np.maximum(flat[idx], value)
+        elif merge == 'min':
+            flat[idx] = np.minimum(flat[idx], value)
+        else:
+            flat[idx] += value
+    return _rasterize_out(out, None)
+
+
+def _split_edges(ua, va, ub, vb, ts):
+    """
+    split the edges (ua, va) -> (ub, vb) at the parameters `ts`
+    (shape (numedges, k), values in [0, 1], sorted along axis 1).
+
+    Returns the pieces as (ua, va, ub, vb), each of shape (numedges * (k-1),)
+    """
+    du, dv = ub - ua, vb - va
+    t0, t1 = ts[:, :-1], ts[:, 1:]
+    pua = (ua[:, None] + t0 * du[:, None]).ravel()
+    pva = (va[:, None] + t0 * dv[:, None]).ravel()
+    pub = (ua[:, None] + t1 * du[:, None]).ravel()
+    pvb = (va[:, None] + t1 * dv[:, None]).ravel()
+    return pua, pva, pub, pvb
+
+
+def _integer_crossings(a, b):
+    """
+    for each segment [a, b] (1D), the integers strictly between a and b
+
+    Returns (segment index, integer) as two arrays
+    """
+    lo = np.floor(np.minimum(a, b)).astype(np.int64) + 1
+    hi = np.ceil(np.maximum(a, b)).astype(np.int64) - 1
+    counts = np.maximum(hi - lo + 1, 0)
+    idx = np.repeat(np.arange(len(a)), counts)
+    offsets = np.cumsum(counts) - counts
+    return idx, np.arange(len(idx)) - offsets[idx] + lo[idx]
+
+
+def _coverage_edges(geom, pixratio, x0, y0, rows):
+    """
+    like _pixel_edges, but each polygon is oriented so that exteriors
+    and interiors have opposite winding, and overlapping polygons of a
+    collection are merged
+    """
+    from shapely.geometry import MultiPolygon
+    from shapely.geometry.polygon import orient
+    from shapely.ops import unary_union
+    if isinstance(geom, GeometryArray):
+        # overlapping polygons have to be merged, which needs shapely geometries
+        geom = geom.to_shapely()
+    polys = [orient(poly, 1.0) for poly in _iter_polygons(geom, pixratio)]
+    if len(polys) > 1 and geom.geom_type != 'MultiPolygon':
+        merged = unary_union(polys)
+        polys = [orient(poly, 1.0) for poly in _iter_polygons(merged, pixratio)]
+    return _pixel_edges(MultiPolygon(polys), pixratio, x0, y0, rows)
+
+
+def _rasterize_coverage_array(geom, pixratio, x0, y0, rows, cols):
+    """
+    exact fractional coverage by signed area accumulation: every edge is
+    split at the pixel boundaries, each piece adds its signed area to the
+    right of it within its pixel and its full height to the following
+    pixels (via a cumulative sum along each row)
+    """
+    acc = np.zeros((rows, cols), dtype=np.float32)
+    edges, _ = _coverage_edges(geom, pixratio, x0, y0, rows)
+    if len(edges) == 0:
+        return acc
+    ua, va, ub, vb = edges.T
+    # clip to the rows of the raster, horizontal edges add nothing
+    dv = vb - va
+    sloped = dv != 0
+    ua, va, ub, vb, dv = ua[sloped], va[sloped], ub[sloped], vb[sloped], dv[sloped]
+    tlo = np.clip(np.minimum(-va / dv, (rows - va) / dv), 0, 1)
+    thi = np.clip(np.maximum(-va / dv, (rows - va) / dv), 0, 1)
+    inside = tlo < thi
+    ua, va, ub, vb = ua[inside], va[inside], ub[inside], vb[inside]
+    ts = np.stack([tlo[inside], thi[inside]], axis=1)
+    ua, va, ub, vb = _split_edges(ua, va, ub, vb, ts)
+    # split at the left and right border, pieces outside are projected onto it
+    du = ub - ua
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tl = np.where(du != 0, -ua / du, 0)
+        tr = np.where(du != 0, (cols - ua) / du, 0)
+    ts = np.stack([np.zeros_like(ua), np.clip(tl, 0, 1), np.clip(tr, 0, 1),
+                   np.ones_like(ua)], axis=1)
+    ts.sort(axis=1)
+    ua, va, ub, vb = _split_edges(ua, va, ub, vb, ts)
+    keep = va != vb
+    ua, va, ub, vb = (np.clip(ua[keep], 0, cols), va[keep],
+                      np.clip(ub[keep], 0, cols), vb[keep])
+    # split at every pixel boundary crossed
+    iu, ku = _integer_crossings(ua, ub)
+    iv, kv = _integer_crossings(va, vb)
+    n = len(ua)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tu = (ku - ua[iu]) / (ub[iu] - ua[iu])
+        tv = (kv - va[iv]) / (vb[iv] - va[iv])
+    pieceidx = np.concatenate([np.arange(n), np.arange(n), iu, iv])
+    tall = np.concatenate([np.zeros(n), np.ones(n), tu, tv])
+    order = np.lexsort((tall, pieceidx))
+    pieceidx, tall = pieceidx[order], tall[order]
+    same = pieceidx[1:] == pieceidx[:-1]
+    idx, t0, t1 = pieceidx[:-1][same], tall[:-1][same], tall[1:][same]
+    du, dv = ub - ua, vb - va
+    umid = ua[idx] + (t0 + t1) * 0.5 * du[idx]
+    vmid = va[idx] + (t0 + t1) * 0.5 * dv[idx]
+    height = (t1 - t0) * dv[idx]
+    r = np.clip(np.floor(vmid).astype(np.int64), 0, rows - 1)
+    c = np.clip(np.floor(umid).astype(np.int64), 0, cols)
+    frac = umid - c
+    flat = acc.reshape(-1)
+    inside = c < cols
+    np.add.at(flat, (r * cols + c)[inside], (height * (1 - frac))[inside])
+    inside = c + 1 < cols
+    np.add.at(flat, (r * cols + c + 1)[inside], (height * frac)[inside])
+    band = 256
+    for row0 in range(0, rows, band):
+        acc[row0:row0+band] = np.cumsum(acc[row0:row0+band], axis=1, dtype=np.float64)
+    np.abs(acc, out=acc)
+    np.minimum(acc, 1, out=acc)
+    return acc
+
+
+def rasterize_coverage(geom, pixratio, xrange=None, yrange=None):
+    """
+    rasterize the geometry as the exact fraction of each pixel covered by it
+
+    Instead of supersampling, the covered area of each pixel is computed
+    analytically from the edges crossing it. Pixels not crossed by any edge
+    are filled with 0 or 1, so the cost is close to that of one binary
+    rasterization at the same pixratio. Geometries without area are
+    buffered by half a pixel, as in `rasterize`
+
+    geom, pixratio, xrange, yrange: see `rasterize`
+
+    Returns
+    =======
+
+    namedtup(array, imageout) where:
+
+        array:    2D array of covered fractions, float32, 0-1
+        imageout: always None
+    """
+    geom, xrange, yrange = _select_scene(geom, xrange, yrange)
+    x0, y0, x1, y1 = _geomselectrange(geom, xrange, yrange)
+    rows, cols = _rastershape(x0, y0, x1, y1, pixratio)
+    array = _rasterize_coverage_array(geom, pixratio, x0, y0, rows, cols)
+    return _rasterize_out(array, None)
+
+
+def _scene_edges(geoms, pixratio, x0, y0, rows):
+    """
+    the pixel edges of many geometries, with the polygons of each geometry
+    in their own groups, so that overlapping geometries are merged
+    """
+    alledges, allgroups = [], []
+    numgroups = 0
+    for geom in geoms:
+        edges, groups = _pixel_edges(geom, pixratio, x0, y0, rows)
+        if len(edges):
+            alledges.append(edges)
+            allgroups.append(groups + numgroups)
+            numgroups += groups[-1] + 1
+    if not alledges:
+        return np.empty((0, 4), dtype=float), np.empty((0,), dtype=np.int64)
+    return np.concatenate(alledges), np.concatenate(allgroups)
+
+
+_window = _namedtuple("window", "row0 row1 col0 col1")
+
+
+class Rasterizer(object):
+    """
+    A raster of a scene of geometries, which can be updated incrementally
+
+    geoms: the geometries of the scene
+    pixratio: how many pixels pro unit
+    xrange, yrange: see `rasterize`. If not given, the bounds of all
+                    geometries are used. The extent of the raster is fixed
+                    at creation
+
+    After an update only the affected window is rasterized again and
+    patched in place. `changed` holds the last changed window
+
+    Example
+    =======
+
+    r = Rasterizer([wall, duct], pixratio=100)
+    duct2 = rotate(duct, 5)
+    win = r.update(duct, duct2)
+    patch = r.array[win.row0:win.row1, win.col0:win.col1]
+    """
+    def __init__(self, geoms, pixratio, xrange=None, yrange=None):
+        self.geoms = list(geoms)
+        self.pixratio = pixratio
+        allbounds = np.array([g.bounds for g in self.geoms if not g.is_empty])
+        if len(allbounds):
+            bounds = (allbounds[:, 0].min(), allbounds[:, 1].min(),
+                      allbounds[:, 2].max(), allbounds[:, 3].max())
+        else:
+            bounds = (0, 0, 0, 0)
+        self.bounds = _boundsselectrange(bounds, xrange, yrange)
+        x0, y0, x1, y1 = self.bounds
+        self.rows, self.cols = _rastershape(x0, y0, x1, y1, pixratio)
+        self.array = np.zeros((self.rows, self.cols), dtype=np.uint8)
+        self.changed = self._rasterize(_window(0, self.rows, 0, self.cols))
+
+    def window(self, bounds):
+        """
+        the pixel window covering `bounds` (x0, y0, x1, y1), expanded
+        by one pixel and clipped to the raster
+        """
+        x0, y0, _, _ = self.bounds
+        pr = self.pixratio
+        bx0, by0, bx1, by1 = bounds
+        col0 = int(np.floor((bx0 - x0) * pr)) - 1
+        col1 = int(np.ceil((bx1 - x0) * pr)) + 1
+        row0 = int(np.floor(self.rows - (by1 - y0) * pr)) - 1
+        row1 = int(np.ceil(self.rows - (by0 - y0) * pr)) + 1
+        return _window(max(row0, 0), min(max(row1, 0), self.rows),
+                       max(col0, 0), min(max(col1, 0), self.cols))
+
+    def _rasterize(self, window):
+        row0, row1, col0, col1 = window
+        if row0 >= row1 or col0 >= col1:
+            return window
+        x0, y0, _, _ = self.bounds
+        pr = self.pixratio
+        # world bounds of the window, to select the geometries touching it
+        wx0, wx1 = x0 + col0 / pr, x0 + col1 / pr
+        wy0, wy1 = y0 + (self.rows - row1) / pr, y0 + (self.rows - row0) / pr
+        geoms = []
+        for geom in self.geoms:
+            if geom.is_empty:
+                continue
+            gx0, gy0, gx1, gy1 = geom.bounds
+            if gx0 <= wx1 and gx1 >= wx0 and gy0 <= wy1 and gy1 >= wy0:
+                geoms.append(geom)
+        edges, groups = _scene_edges(geoms, pr, x0, y0, self.rows)
+        spans = _scanline_spans(edges, groups, row0, row1, col0, col1)
+        _fill_spans(self.array[row0:row1, col0:col1], *spans, row0=row0, col0=col0)
+        return window
+
+    def _index(self, geom):
+        for i, g in enumerate(self.geoms):
+            if g is geom:
+                return i
+        for i, g in enumerate(self.geoms):
+            if g.equals(geom):
+                return i
+        raise ValueError("geometry not found in this Rasterizer")
+
+    def update(self, old_geom, new_geom):
+        """
+        replace `old_geom` with `new_geom` and rasterize the union of
+        their bounds again
+
+        old_geom: a geometry of the scene, or None to add `new_geom`
+        new_geom: the new geometry, or None to remove `old_geom`
+
+        Returns
+        =======
+
+        the changed window as namedtup(row0, row1, col0, col1). The
+        changed pixels are self.array[row0:row1, col0:col1]. Empty
+        geometries have no window: if both are empty, nothing changes
+        and the window is empty
+        """
+        if old_geom is None and new_geom is None:
+            raise ValueError("at least one geometry should be given")
+        bounds = [g.bounds for g in (old_geom, new_geom)
+                  if g is not None and not g.is_empty]
+        if old_geom is None:
+            self.geoms.append(new_geom)
+        elif new_geom is None:
+            del self.geoms[self._index(old_geom)]
+        else:
+            self.geoms[self._index(old_geom)] = new_geom
+        if not bounds:
+            self.changed = _window(0, 0, 0, 0)
+            return self.changed
+        bounds = (min(b[0] for b in bounds), min(b[1] for b in bounds),
+                  max(b[2] for b in bounds), max(b[3] for b in bounds))
+        self.changed = self._rasterize(self.window(bounds))
+        return self.changed
+
+
+# the default width of the band of distance_field, in pixels
+_DISTANCE_BAND = 16
+
+# the size of the square cells in which distance_field bins the segments
+_DISTANCE_CELL = 4
+
+
+def _segment_sqdistance(px, py, dx, dy):
+    """
+    the squared distance from the points (px, py) to the segments from
+    (0, 0) to (dx, dy). The arrays are broadcast together
+    """
+    dd = dx * dx + dy * dy
+    with np.errstate(divide='ignore'):
+        inv = np.where(dd > 0, 1 / dd, 0).astype(dd.dtype)
+    t = (px * dx + py * dy) * inv
+    np.clip(t, 0, 1, out=t)
+    qx, qy = px - t * dx, py - t * dy
+    return qx * qx + qy * qy
+
+
+def _piece_cells(pieces, band, size, cellshape, chunksize=1 << 20):
+    """
+    iterate, in chunks, over the (piece, cell) pairs of the cells of
+    `size` pixels touched by the bounding box of each piece (x0, y0, x1,
+    y1, in pixel coordinates) expanded by `band`, as (pieces, cells,
+    distance from the center of the cell to the piece)
+    """
+    ncellrows, ncellcols = cellshape
+    xmin, xmax = np.minimum(pieces[:, 0], pieces[:, 2]), np.maximum(pieces[:, 0], pieces[:, 2])
+    ymin, ymax = np.minimum(pieces[:, 1], pieces[:, 3]), np.maximum(pieces[:, 1], pieces[:, 3])
+    r0 = np.clip(np.floor((ymin - band) / size), 0, ncellrows).astype(np.int64)
+    r1 = np.clip(np.floor((ymax + band) / size) + 1, 0, ncellrows).astype(np.int64)
+    c0 = np.clip(np.floor((xmin - band) / size), 0, ncellcols).astype(np.int64)
+    c1 = np.clip(np.floor((xmax + band) / size) + 1, 0, ncellcols).astype(np.int64)
+    widths = c1 - c0
+    counts = (r1 - r0) * widths
+    cumcounts = np.cumsum(counts)
+    start = 0
+    while start < len(counts):
+        base = cumcounts[start - 1] if start else 0
+        end = max(int(np.searchsorted(cumcounts, base + chunksize, side='right')), start + 1)
+        sel = np.arange(start, end)
+        pidx = np.repeat(sel, counts[sel])
+        local = np.arange(len(pidx)) - np.repeat(cumcounts[sel] - counts[sel] - base, counts[sel])
+        i = r0[pidx] + local // widths[pidx]
+        j = c0[pidx] + local % widths[pidx]
+        p = pieces[pidx]
+        d = np.sqrt(_segment_sqdistance((j + 0.5) * size - p[:, 0], (i + 0.5) * size - p[:, 1],
+                                        p[:, 2] - p[:, 0], p[:, 3] - p[:, 1]))
+        yield pidx, i * ncellcols + j, d
+        start = end
+
+
+def distance_field(geom, pixratio, xrange=None, yrange=None, max_distance=None):
+    """
+    the signed distance from the center of each pixel to the nearest edge
+    of the geometry
+
+    The distance is computed exactly from the segments of the geometry
+    (no distance transform of a mask). The grid is divided in cells of a
+    few pixels, and each cell within `max_distance` of a segment is
+    evaluated against the segments that can be the nearest to one of its
+    pixels, so the work is proportional to the size of this band and not
+    to the size of the grid
+
+    geom, pixratio, xrange, yrange: see `rasterize`
+    max_distance: the width of the band around the edges, in the units of
+                  the geometry. Distances are clipped to +/- max_distance.
+                  If None, the band is 16 pixels wide. With inf the distance
+                  is computed for the whole grid: every segment is then
+                  measured against every cell, which for large grids is
+                  orders of magnitude slower than a bounded band
+
+    Returns
+    =======
+
+    2D array of distances, float32. Negative inside the geometry,
+    positive outside. (0, 0) is left upper corner
+    """
+    geom, xrange, yrange = _select_scene(geom, xrange, yrange)
+    x0, y0, x1, y1 = _geomselectrange(geom, xrange, yrange)
+    rows, cols = _rastershape(x0, y0, x1, y1, pixratio)
+    if max_distance is None:
+        max_distance = _DISTANCE_BAND / pixratio
+    if np.isinf(max_distance):
+        band = rows + cols
+    else:
+        band = int(np.ceil(max_distance * pixratio))
+    # segments in pixel coordinates, split so that their bounding box
+    # (expanded by the band) stays close to the band itself
+    if isinstance(geom, GeometryArray):
+        segs = geom.segments()
+    else:
+        segs = util.geom_segments(geom)
+    segs[:, 0::2] = (segs[:, 0::2] - x0) * pixratio
+    segs[:, 1::2] = rows - (segs[:, 1::2] - y0) * pixratio
+    maxlen = max(2 * band, 16)
+    lengths = np.hypot(segs[:, 2] - segs[:, 0], segs[:, 3] - segs[:, 1])
+    numpieces = np.maximum(np.ceil(lengths / maxlen).astype(np.int64), 1)
+    idx = np.repeat(np.arange(len(segs)), numpieces)
+    offsets = np.cumsum(numpieces) - numpieces
+    k = np.arange(len(idx)) - offsets[idx]
+    t0 = (k / numpieces[idx])[:, None]
+    t1 = ((k + 1) / numpieces[idx])[:, None]
+    a, b = segs[idx, 0:2], segs[idx, 2:4]
+    pieces = np.concatenate([a + (b - a) * t0, a + (b - a) * t1], axis=1)
+    size = _DISTANCE_CELL
+    cellshape = (-(-rows // size), -(-cols // size))
+    ncells = cellshape[0] * cellshape[1]
+    maxd = max_distance * pixratio
+    # the distance from the center of a cell to its nearest piece bounds
+    # the distance of all its pixels within half a diagonal. Pieces
+    # farther than this bound (or than the band) cannot be the nearest
+    # to any pixel of the cell and are not evaluated
+    halfdiag = size * np.sqrt(0.5)
+    bound = np.full(ncells, np.inf)
+    for pidx, cell, d in _piece_cells(pieces, band, size, cellshape):
+        np.minimum.at(bound, cell, d + halfdiag)
+    np.minimum(bound, maxd, out=bound)
+    pairs = []
+    for pidx, cell, d in _piece_cells(pieces, band, size, cellshape):
+        keep = d - halfdiag <= bound[cell]
+        pairs.append((pidx[keep], cell[keep]))
+    blocks = np.full((ncells, size * size), maxd, dtype=np.float32)
+    if pairs:
+        pidx, cell = map(np.concatenate, zip(*pairs))
+        order = np.argsort(cell, kind='stable')
+        pidx, cell = pidx[order], cell[order]
+        # the offsets of the pixel centers from the corner of their cell
+        oi, oj = np.divmod(np.arange(size * size, dtype=np.float32), size)
+        oi, oj = oi + 0.5, oj + 0.5
+        # evaluate the pairs in chunks of whole cells, each cell reduced
+        # to the distance to its nearest piece
+        chunksize = max((1 << 22) // (size * size), 1)
+        start = 0
+        while start < len(cell):
+            end = min(start + chunksize, len(cell))
+            end = int(np.searchsorted(cell, cell[end - 1], side='right'))
+            c, p = cell[start:end], pieces[pidx[start:end]]
+            firsts = np.flatnonzero(np.r_[True, c[1:] != c[:-1]])
+            ci, cj = np.divmod(c, cellshape[1])
+            # relative to the start of the piece, small enough for float32
+            px = (cj * size - p[:, 0]).astype(np.float32)[:, None] + oj
+            py = (ci * size - p[:, 1]).astype(np.float32)[:, None] + oi
+            dx = (p[:, 2] - p[:, 0]).astype(np.float32)[:, None]
+            dy = (p[:, 3] - p[:, 1]).astype(np.float32)[:, None]
+            nearest = np.minimum.reduceat(_segment_sqdistance(px, py, dx, dy), firsts, axis=0)
+            blocks[c[firsts]] = np.minimum(np.sqrt(nearest), maxd)
+            start = end
+    out = (blocks.reshape(cellshape[0], cellshape[1], size, size)
+           .transpose(0, 2, 1, 3)
+           .reshape(cellshape[0] * size, cellshape[1] * size)[:rows, :cols].copy())
+    out /= pixratio
+    inside = np.empty((rows, cols), dtype=np.uint8)
+    edges, groups = _pixel_edges(geom, pixratio, x0, y0, rows, buffer_lines=False)
+    _fill_spans(inside, *_scanline_spans(edges, groups, 0, rows, 0, cols))
+    np.negative(out, out=out, where=inside.view(bool))
+    return out
+
+
+def _block_reduce(array, reduce):
+    """
+    reduce each 2x2 block of `array` to one pixel. Odd sizes are padded
+    with 0 (outside of the raster is empty)
+    """
+    rows, cols = array.shape
+    if rows % 2 or cols % 2:
+        padded = np.zeros((rows + rows % 2, cols + cols % 2), dtype=array.dtype)
+        padded[:rows, :cols] = array
+        array = padded
+    blocks = array.reshape(array.shape[0] // 2, 2, array.shape[1] // 2, 2)
+    if reduce == 'any':
+        return blocks.max(axis=(1, 3))
+    elif reduce == 'all':
+        return blocks.min(axis=(1, 3))
+    return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+
+class RasterPyramid(object):
+    """
+    A lazily evaluated multi-resolution pyramid of a rasterized geometry
+
+    Level 0 is the rasterization at the base pixratio, each following level
+    halves the resolution by reducing 2x2 blocks of the previous one.
+    Levels (including level 0) are only computed when accessed, and
+    then cached. Use `rasterize_pyramid` to create one
+    """
+    _reductions = ('any', 'all', 'mean')
+
+    def __init__(self, geom, pixratio, levels, reduce='any', xrange=None, yrange=None,
+                 backend=None):
+        if reduce not in self._reductions:
+            raise ValueError("reduce should be one of {0}, got {1}".format(
+                self._reductions, reduce))
+        self.geom = geom
+        self.pixratio = pixratio
+        self.reduce = reduce
+        self.xrange, self.yrange = xrange, yrange
+        self.backend = backend
+        self.pixratios = [pixratio / 2**level for level in range(levels)]
+        self._levels = [None] * levels
+
+    def __len__(self):
+        return len(self._levels)
+
+    def __getitem__(self, level):
+        if level < 0:
+            level += len(self)
+        if not 0 <= level < len(self):
+            raise IndexError("level out of range")
+        array = self._levels[level]
+        if array is None:
+            if level == 0:
+                array = rasterize(self.geom, self.pixratio, self.xrange, self.yrange,
+                                  backend=self.backend).array
+                if self.reduce == 'mean':
+                    array = array.astype(np.float32)
+            else:
+                array = _block_reduce(self[level - 1], self.reduce)
+            self._levels[level] = array
+        return array
+
+    def __iter__(self):
+        for level in range(len(self)):
+            yield self[level]
+
+
+def rasterize_pyramid(geom, base_pixratio, levels, reduce='any', xrange=None,
+                      yrange=None, backend=None):
+    """
+    rasterize the geometry once and derive coarser resolutions from it
+
+    geom, xrange, yrange, backend: see `rasterize`
+    base_pixratio: pixratio of the finest level (level 0)
+    levels: number of levels. Level n has a pixratio of base_pixratio / 2**n
+    reduce: how a 2x2 block is reduced to a pixel of the next level:
+            'any': set if any pixel is set (uint8, 0-1)
+            'all': set if all pixels are set (uint8, 0-1)
+            'mean': the fraction of set pixels (float32, 0-1)
+
+    Returns
+    =======
+
+    a RasterPyramid. pyramid[n] is the 2D array at level n. Levels are
+    computed on first access, so unused levels cost nothing
+    """
+    return RasterPyramid(geom, base_pixratio, levels, reduce=reduce, xrange=xrange,
+                         yrange=yrange, backend=backend)
+
+
+def iter_rasterize(geom, pixratio, xrange=None, yrange=None, band_rows=256, lod=True):
+    """
+    rasterize the geometry band by band, from top to bottom
+
+    The edges are sorted once by their first row and an active edge table
+    is carried from band to band, so that each band only processes the
+    edges crossing it. Peak memory is O(band_rows * cols)
+
+    geom, pixratio, xrange, yrange, lod: see `rasterize`
+    band_rows: the number of rows of each band
+
+    Yields
+    ======
+
+    (row_offset, band) where band is a 2D uint8 array (0-1) with the rows
+    [row_offset:row_offset+len(band)] of the raster. NB: the same buffer
+    is reused for every band, copy it if it needs to be kept
+
+    Example
+    =======
+
+    for row, band in iter_rasterize(geom, 1000):
+        dataset[row:row+len(band)] = band
+    """
+    geom, xrange, yrange = _select_scene(geom, xrange, yrange)
+    if lod:
+        geom, xrange, yrange = _apply_lod(geom, pixratio, xrange, yrange)
+    x0, y0, x1, y1 = _geomselectrange(geom, xrange, yrange)
+    rows, cols = _rastershape(x0, y0, x1, y1, pixratio)
+    edges, groups = _pixel_edges(geom, pixratio, x0, y0, rows)
+    vmin = np.minimum(edges[:, 1], edges[:, 3])
+    vmax = np.maximum(edges[:, 1], edges[:, 3])
+    firstrow = np.ceil(vmin - 0.5)
+    order = np.argsort(firstrow, kind='stable')
+    edges, groups, firstrow = edges[order], groups[order], firstrow[order]
+    lastrow = np.ceil(vmax[order] - 0.5)
+    buf = np.empty((min(band_rows, rows), cols), dtype=np.uint8)
+    active = np.empty((0,), dtype=np.int64)
+    pointer = 0
+    for row0 in range(0, rows, band_rows):
+        row1 = min(row0 + band_rows, rows)
+        # add the edges starting before the end of this band and
+        # drop the ones which ended before its start
+        newpointer = int(np.searchsorted(firstrow, row1, side='left'))
+        active = np.concatenate([active[lastrow[active] > row0],
+                                 np.arange(pointer, newpointer)])
+        pointer = newpointer
+        band = buf[:row1 - row0]
+        spans = _scanline_spans(edges[active], groups[active], row0, row1, 0, cols)
+        _fill_spans(band, *spans, row0=row0)
+        yield row0, band
+
+
+_cachestats = _namedtuple("cachestats", "hits misses numfiles size")
+
+
+class RasterCache(object):
+    """
+    A persistent, content-addressed cache for the results of `rasterize`
+
+    Results are stored as .npy files in `path`, keyed by a hash of the
+    WKB of the geometry, the rasterization parameters and the backend.
+    Cached arrays are loaded as read-only memory maps. When the total size
+    exceeds `maxsize` (in bytes), the least recently used files are removed
+
+    Example
+    =======
+
+    cache = RasterCache("~/.cache/shapelib", maxsize=2**30)
+    array = rasterize(geom, 300, cache=cache).array
+    print(cache.stats)
+    """
+    def __init__(self, path, maxsize=2**30):
+        self.path = os.path.expanduser(path)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+    @staticmethod
+    def key(geom, pixratio, xrange, yrange, backend, lod=True):
+        """
+        the key identifying a rasterization
+        """
+        import hashlib
+        h = hashlib.sha256(geom.wkb)
+        h.update(repr((pixratio, xrange, yrange, backend, lod)).encode('ascii'))
+        return h.hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + '.npy')
+
+    def _files(self):
+        files = [os.path.join(self.path, f) for f in os.listdir(self.path)
+                 if f.endswith('.npy')]
+        return [(os.stat(f), f) for f in files]
+
+    def get(self, key):
+        """
+        the cached array for `key` (a read-only memmap), or None
+        """
+        filename = self._filename(key)
+        try:
+            array = np.load(filename, mmap_mode='r')
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+        # the modification time is used as access time for eviction
+        os.utime(filename, None)
+        self.hits += 1
+        return array
+
+    def put(self, key, array):
+        """
+        store `array` under `key`, evicting old entries if needed
+        """
+        # a unique temporary file, so that concurrent writers of the
+        # same key do not clobber each other before the atomic rename
+        fd, tmpfile = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.asarray(array))
+            os.replace(tmpfile, self._filename(key))
+        except BaseException:
+            os.remove(tmpfile)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        remove the least recently used entries until the cache
+        is within maxsize
+        """
+        files = sorted(self._files(), key=lambda item: item[0].st_mtime)
+        total = sum(st.st_size for st, _ in files)
+        for st, f in files:
+            if total <= self.maxsize:
+                break
+            try:
+                os.remove(f)
+            except OSError:
+                continue
+            total -= st.st_size
+
+    def clear(self):
+        """
+        remove all entries and reset the counters
+        """
+        for _, f in self._files():
+            os.remove(f)
+        self.hits = self.misses = 0
+
+    @property
+    def stats(self):
+        """
+        namedtup(hits, misses, numfiles, size)
+        """
+        files = self._files()
+        return _cachestats(self.hits, self.misses, len(files),
+                           sum(st.st_size for st, _ in files))
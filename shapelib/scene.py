@@ -0,0 +1,225 @@
+"""
+Scenes: many geometries together with a spatial index, to query
+parts of a scene without walking all of it
+"""
+from __future__ import absolute_import
+
+import numpy as np
+from shapely.geometry import GeometryCollection, Point, box
+
+from . import util
+from .core import _as_xy
+
+
+def _strtree(geoms):
+    from shapely.strtree import STRtree
+    # shapely < 2 returns the items given, shapely >= 2 the indices
+    try:
+        return STRtree(geoms, items=range(len(geoms)))
+    except TypeError:
+        return STRtree(geoms)
+
+
+def _tree_query(tree, geom):
+    if hasattr(tree, 'query_items'):
+        return np.array(tree.query_items(geom), dtype=np.int64)
+    return np.asarray(tree.query(geom), dtype=np.int64).ravel()
+
+
+def _tree_nearest(tree, geom):
+    if hasattr(tree, 'nearest_item'):
+        return tree.nearest_item(geom)
+    return int(np.asarray(tree.nearest(geom)).ravel()[0])
+
+
+class Scene(object):
+    """
+    A collection of geometries with a STRtree index
+
+    Each geometry is identified by the key returned by `insert`.
+    Geometries can be inserted and removed at any time: the changes
+    since the index was built are kept aside (and scanned linearly)
+    until they exceed `rebuildfraction` of the scene, when the index
+    is rebuilt at the next query
+
+    A Scene can be passed to rasterize and to the plotting functions,
+    in which case only the geometries within the selected ranges are
+    used (see Scene.select)
+
+    Example
+    =======
+
+    >>> from shapelib import circles
+    >>> scene = Scene(circles(np.arange(100), 0, 0.4).geoms)
+    >>> scene.query((10, -1, 12, 1)).tolist()
+    [10, 11, 12]
+    >>> key = scene.insert(box(50, 5, 51, 6))
+    >>> scene.nearest([(50.5, 4.5)]).tolist() == [key]
+    True
+    """
+    rebuildfraction = 0.1
+    # below this number of changes the index is never rebuilt
+    minchanges = 64
+
+    def __init__(self, geoms=()):
+        self._geoms = {}
+        self._nextkey = 0
+        self._tree = None
+        self._treekeys = np.empty((0,), dtype=np.int64)
+        self._pending = set()
+        self._removed = set()
+        for geom in geoms:
+            self.insert(geom)
+        self._build()
+
+    def __len__(self):
+        return len(self._geoms)
+
+    def __getitem__(self, key):
+        return self._geoms[key]
+
+    def __contains__(self, key):
+        return key in self._geoms
+
+    def __iter__(self):
+        return iter(self._geoms.values())
+
+    def keys(self):
+        """
+        the keys of all the geometries, in order of insertion
+        """
+        return list(self._geoms.keys())
+
+    def insert(self, geom):
+        """
+        add a geometry to the scene and return its key
+        """
+        key = self._nextkey
+        self._nextkey += 1
+        self._geoms[key] = geom
+        self._pending.add(key)
+        return key
+
+    def remove(self, key):
+        """
+        remove the geometry with the given key from the scene
+        """
+        del self._geoms[key]
+        if key in self._pending:
+            self._pending.discard(key)
+        else:
+            self._removed.add(key)
+
+    def _build(self):
+        keys = list(self._geoms.keys())
+        self._treekeys = np.array(keys, dtype=np.int64)
+        self._tree = _strtree([self._geoms[k] for k in keys]) if keys else None
+        self._pending = set()
+        self._removed = set()
+
+    def _update(self, force=False):
+        changes = len(self._pending) + len(self._removed)
+        if changes and (force or changes > max(self.minchanges,
+                                                self.rebuildfraction * len(self._geoms))):
+            self._build()
+
+    @property
+    def bounds(self):
+        """
+        the bounds (x0, y0, x1, y1) of all the geometries, or () if
+        the scene has no geometries or they are all empty
+        """
+        b = np.array([g.bounds for g in self._geoms.values() if not g.is_empty])
+        if not len(b):
+            return ()
+        return tuple(b[:, :2].min(axis=0).tolist() + b[:, 2:].max(axis=0).tolist())
+
+    def query(self, bounds):
+        """
+        the keys of the geometries whose bounding box intersects
+        `bounds` (x0, y0, x1, y1), sorted
+        """
+        self._update()
+        window = box(*bounds)
+        keys = []
+        if self._tree is not None:
+            keys = self._treekeys[_tree_query(self._tree, window)].tolist()
+            if self._removed:
+                keys = [k for k in keys if k not in self._removed]
+        x0, y0, x1, y1 = bounds
+        for key in self._pending:
+            gx0, gy0, gx1, gy1 = self._geoms[key].bounds or (np.inf, np.inf, -np.inf, -np.inf)
+            if gx0 <= x1 and gx1 >= x0 and gy0 <= y1 and gy1 >= y0:
+                keys.append(key)
+        return np.array(sorted(keys), dtype=np.int64)
+
+    def nearest(self, points):
+        """
+        the key of the geometry nearest to each point
+
+        points: an array of shape (N, 2)
+
+        Returns
+        =======
+
+        an array of N keys
+        """
+        if not self._geoms:
+            raise ValueError("the scene is empty")
+        # removed geometries cannot be excluded from a nearest search
+        self._update(force=bool(self._removed))
+        pts = _as_xy(points)
+        out = np.empty(len(pts), dtype=np.int64)
+        pending = [(key, self._geoms[key]) for key in self._pending]
+        for i, (x, y) in enumerate(pts.tolist()):
+            p = Point(x, y)
+            best, bestdist = None, np.inf
+            if self._tree is not None:
+                best = self._treekeys[_tree_nearest(self._tree, p)]
+                bestdist = self._geoms[best].distance(p)
+            for key, geom in pending:
+                dist = geom.distance(p)
+                if dist < bestdist:
+                    best, bestdist = key, dist
+            out[i] = best
+        return out
+
+    def clip(self, window):
+        """
+        the geometries intersecting window (x0, y0, x1, y1), clipped to it
+
+        Returns
+        =======
+
+        a GeometryCollection
+        """
+        x0, y0, x1, y1 = window
+        clipbox = box(*window)
+        geoms = []
+        for key in self.query(window):
+            geom = self._geoms[key]
+            gx0, gy0, gx1, gy1 = geom.bounds
+            if gx0 < x0 or gy0 < y0 or gx1 > x1 or gy1 > y1:
+                geom = geom.intersection(clipbox)
+                if geom.is_empty:
+                    continue
+            geoms.append(geom)
+        return GeometryCollection(geoms)
+
+    def geometry(self):
+        """
+        all the geometries of the scene as a GeometryCollection
+        """
+        return GeometryCollection(list(self._geoms.values()))
+
+    def select(self, xrange=None, yrange=None):
+        """
+        the geometries within the given ranges (see util.geom_getbounds),
+        clipped to them, or all the geometries if no range is given
+        """
+        if xrange is None and yrange is None:
+            return self.geometry()
+        return self.clip(util.geom_getbounds(self, xrange, yrange))
+
+    def __repr__(self):
+        return "Scene(numgeoms={0})".format(len(self._geoms))
@@ -5,11 +5,24 @@
 ###################################
 from __future__ import absolute_import
 import itertools as _itertools
+import numpy as _np
+from collections import namedtuple as _namedtuple
 from numbers import Number as _Number
+try:
+    # shapely >= 2
+    from shapely import get_num_coordinates as _get_num_coordinates
+except ImportError:
+    from shapely.geos import lgeos as _lgeos
+
+    def _get_num_coordinates(geom):
+        return _lgeos.GEOSGetNumCoordinates(geom._geom)
 
 def window(iterable, size, step):
     """
     iterate over subseqs of iterable
+
+    If iterable is a 1D numpy array, a read-only strided view of shape
+    (numwindows, size) is returned instead, without copying
     
     Example
     =======
@@ -21,14 +34,25 @@ def window(iterable, size, step):
     
     >>> list(window(seq, 3, 2))
     [(0, 1, 2), (2, 3, 4)]
+
+    >>> window(_np.arange(6), 2, 2)
+    array([[0, 1],
+           [2, 3],
+           [4, 5]])
     """
+    if isinstance(iterable, _np.ndarray) and iterable.ndim == 1:
+        numwindows = max((len(iterable) - size) // step + 1, 0)
+        stride = iterable.strides[0]
+        return _np.lib.stride_tricks.as_strided(
+            iterable, shape=(numwindows, size), strides=(stride * step, stride),
+            writeable=False)
     iterators = _itertools.tee(iterable, size)
     for skip_steps, itr in enumerate(iterators):
         for ignored in _itertools.islice(itr, skip_steps):
             pass
-    window_itr = _itertools.izip(*iterators)
+    window_itr = zip(*iterators)
     if step != 1:
-        window_itr = _itertools.islice(window_itr, 0, 99999999, step)
+        window_itr = _itertools.islice(window_itr, 0, None, step)
     return window_itr
 
 def geom_getbounds(geom, xr, yr):
@@ -48,15 +72,99 @@ def geom_getbounds(geom, xr, yr):
 
     (x0, y0, x1, y1)
     """
-    x0, y0, x1, y1 = geom.bounds
+    # an empty geometry has no bounds, both ranges should be given
+    x0, y0, x1, y1 = geom.bounds or (None,) * 4
     
     def override(c0, c1, r):
         if r is not None:
             if isinstance(r, _Number):
-                c1 = min(c1, r)
+                c1 = r if c1 is None else min(c1, r)
             else:
                 c0, c1 = r
         return c0, c1
     x0, x1 = override(x0, x1, xr)
     y0, y1 = override(y0, y1, yr)
+    if None in (x0, y0, x1, y1):
+        raise ValueError("the geometry is empty, xrange and yrange should be "
+                         "given as (start, end)")
     return x0, y0, x1, y1
+
+
+def geom_segments(geom):
+    """
+    Return all the segments of the lines and rings of `geom` (for polygons,
+    the segments of the exterior and interior rings). Points are returned
+    as segments of length 0
+
+    Returns
+    =======
+
+    an array of shape (numsegments, 4), where each row is (x0, y0, x1, y1)
+    """
+    parts = []
+
+    def collect(g):
+        if g.is_empty:
+            return
+        geomtype = g.geom_type
+        if geomtype == 'Polygon':
+            collect(g.exterior)
+            for interior in g.interiors:
+                collect(interior)
+        elif hasattr(g, 'geoms'):
+            for sub in g.geoms:
+                collect(sub)
+        else:
+            coords = _np.asarray(g.coords)[:, :2]
+            if len(coords) == 1:
+                coords = _np.concatenate([coords, coords])
+            seg = _np.empty((len(coords) - 1, 4), dtype=float)
+            seg[:, 0:2] = coords[:-1]
+            seg[:, 2:4] = coords[1:]
+            parts.append(seg)
+
+    collect(geom)
+    if not parts:
+        return _np.empty((0, 4), dtype=float)
+    return _np.concatenate(parts)
+
+
+def geom_numcoords(geom):
+    """
+    Return the number of coordinates (vertices) of `geom`, counted by GEOS
+    """
+    if geom.is_empty:
+        return 0
+    return int(_get_num_coordinates(geom))
+
+
+_lod = _namedtuple("lod", "geom removed")
+
+
+def geom_lod(geom, pixratio, pixels=0.5):
+    """
+    Simplify `geom` for rendering at the given pixratio, removing the
+    detail which is smaller than `pixels` pixels. The topology is preserved
+
+    The geometry is only simplified if its vertices are denser than the
+    tolerance (on average, more than one vertex every `pixels` pixels of
+    its length). Otherwise it is returned as is: simplifying would cost
+    more than it saves, and would change the raster
+
+    geom: a geometry
+    pixratio: how many pixels pro unit
+    pixels: the tolerance of the simplification, in pixels
+
+    Returns
+    =======
+
+    namedtup(geom, removed) where:
+
+        geom:    the simplified geometry
+        removed: the number of vertices removed
+    """
+    numcoords = geom_numcoords(geom)
+    if numcoords * pixels <= geom.length * pixratio:
+        return _lod(geom, 0)
+    simplified = geom.simplify(pixels / pixratio, preserve_topology=True)
+    return _lod(simplified, numcoords - geom_numcoords(simplified))
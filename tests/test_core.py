@@ -0,0 +1,141 @@
+import numpy as np
+import pytest
+import shapely.ops
+from shapely.geometry import Point, LineString, Polygon, MultiPolygon, MultiLineString
+
+from shapelib import core, GeometryArray
+
+
+@pytest.mark.parametrize("radius", [0, -1])
+def test_circle_degenerate_radius(radius):
+    assert Point(0, 0).buffer(radius).is_empty
+    assert core.circle(0, 0, radius).is_empty
+    cs = core.circles([0, 10], 0, [radius, 1])
+    assert cs.geoms[0].is_empty
+    assert cs.geoms[1].equals(core.circle(10, 0, 1))
+    ga = GeometryArray.circles([0, 10], 0, [radius, 1])
+    assert ga[0].is_empty
+    assert ga[1].equals(core.circle(10, 0, 1))
+
+
+@pytest.mark.parametrize("radius, width", [(3, 0), (3, -1), (0, 1), (-1, 1)])
+def test_ring_degenerate(radius, width):
+    assert core.ring(0, 0, radius, width).is_empty
+    rs = core.rings([0, 10], 0, [radius, 3], [width, 1])
+    assert rs.geoms[0].is_empty
+    assert rs.geoms[1].is_valid and rs.geoms[1].equals(core.ring(10, 0, 3, 1))
+    ga = GeometryArray.rings([0, 10], 0, [radius, 3], [width, 1])
+    assert ga[0].is_empty
+    assert ga[1].equals(core.ring(10, 0, 3, 1))
+    assert np.allclose(ga.bounds, (7, -3, 13, 3))
+
+
+def test_ring_valid():
+    for radius, width in [(3, 1), (3, 3), (3, 5)]:
+        assert core.ring(0, 0, radius, width).is_valid
+
+
+def _polygon():
+    outer = [(0, 0), (10, 0), (12, 6), (6, 9), (-1, 5)]
+    return Polygon(outer, [[(3, 3), (6, 3), (5, 5)]])
+
+
+def _points(n=200, seed=0):
+    return np.random.RandomState(seed).uniform(-4, 15, size=(n, 2))
+
+
+def test_nearest_point_matches_shapely():
+    geom = _polygon()
+    pts = _points()
+    batch = core.nearest_points(geom, pts)
+    for p, q in zip(pts, batch):
+        expected = shapely.ops.nearest_points(geom, Point(p))[0]
+        got = core.nearest_point(geom, tuple(p))
+        assert abs(got.distance(Point(p)) - expected.distance(Point(p))) < 1e-9
+        assert np.allclose(q, got.coords[0])
+
+
+def test_public_names():
+    import shapelib
+    # shapelib re-exports core with "from .core import *"
+    for name in ('rotate', 'asPoint', 'MultiPoint', 'MultiLineString', 'nearest_point'):
+        assert hasattr(shapelib, name)
+
+
+def test_line_angle_at_matches_finite_differences():
+    line = LineString([(0, 0), (3, 1), (4, 5), (1, 7), (-2, 6)])
+    h = 1e-6
+    for d in np.linspace(0.1, line.length - 0.1, 50):
+        # away from the vertices, the angle is that of the segment
+        if min(abs(d - line.project(Point(c))) for c in line.coords) < 0.01:
+            continue
+        p = line.interpolate(d)
+        expected = core.angle_from_points(line.interpolate(d - h), line.interpolate(d + h))
+        assert abs(core.line_angle_at(line, p) - expected) < 1e-6
+
+
+def test_angles_batch_matches_scalar():
+    pts = _points(50)
+    for geom in (_polygon(), LineString([(0, 0), (3, 1), (4, 5), (1, 7)])):
+        batch = core.angles_at(geom, pts)
+        scalar = [core.angle_at(geom, tuple(p)) for p in pts]
+        assert np.allclose(batch, scalar)
+    a, b = pts[:25], pts[25:]
+    assert np.allclose(core.angles_from_points(a, b),
+                       [core.angle_from_points(p, q) for p, q in zip(a, b)])
+    line = LineString([(0, 0), (3, 1), (4, 5)])
+    onl = np.array([line.interpolate(d).coords[0] for d in (0.5, 2, 4)])
+    perps = core.perpendiculars_at(line, onl, 2)
+    for p, perp in zip(onl, perps):
+        assert np.allclose(perp, core.perpendicular_at(line, tuple(p), 2).coords)
+
+
+def test_circles_match_buffer():
+    cx, cy, radius = [0, 5, 9], [1, -2, 3], [1, 0.5, 2]
+    cs = core.circles(cx, cy, radius)
+    rs = core.rings(cx, cy, radius, 0.25)
+    for x, y, r, c, ring in zip(cx, cy, radius, cs.geoms, rs.geoms):
+        buffered = Point(x, y).buffer(r, 16)
+        assert c.symmetric_difference(buffered).area < 1e-9
+        assert c.equals(core.circle(x, y, r))
+        assert ring.is_valid and ring.equals(core.ring(x, y, r, 0.25))
+        expected = buffered.difference(Point(x, y).buffer(r - 0.25, 16))
+        assert ring.symmetric_difference(expected).area < 1e-9
+
+
+@pytest.mark.parametrize("begin", ['closed', 'flat', 'open'])
+@pytest.mark.parametrize("end", ['closed', 'flat', 'open'])
+def test_tube_matches_boolean(begin, end):
+    line = LineString([(0, 0), (4, 0), (6, 3), (6, 8)])
+    tube = core.linestr_to_tube(line, 1, 0.1, begin, end)
+    expected = core._tube_boolean(line, 1, 0.1, begin, end)
+    assert tube.is_valid
+    # the boolean flat cap overshoots by 1% of its length
+    tolerance = 0.02 if 'flat' in (begin, end) else 1e-3
+    assert tube.symmetric_difference(expected).area < tolerance * expected.area
+
+
+def test_line_extrapolate_point():
+    core.test_line_extrpolate_point()
+
+
+def test_lines_extend_matches_line_extend():
+    ls = [LineString([(0, 0), (1, 0)]), LineString([(0, 0), (0, 0), (2, 2), (2, 5)]),
+          LineString([(1, 1), (3, 0), (3, 0)])]
+    distances = [1, 0.5, 2]
+    for l, d, extended in zip(ls, distances, core.lines_extend(ls, distances)):
+        expected = core.line_extend(core.line_extend(l, l.coords[0], d), l.coords[-1], d)
+        assert np.allclose(extended.coords, expected.coords)
+
+
+def test_angles_at_multipart_matches_scalar():
+    pts = np.random.RandomState(2).uniform(-4, 10, size=(300, 2))
+    geom = MultiPolygon([core.circle(0, 0, 2), core.circle(5, 0, 1), core.circle(1, 0, 3)])
+    scalar = [core.angle_at(geom, tuple(p)) for p in pts]
+    assert np.allclose(core.angles_at(geom, pts), scalar)
+    # a line is angled along its buffer, whose 1e-8 caps make the batch
+    # and the scalar projections disagree: compare the choice of the part
+    geom = MultiLineString([[(0, 0), (3, 1)], [(5, 5), (8, 2), (9, 6)]])
+    nearest = [core._nearest_part(geom, Point(p)) for p in pts]
+    expected = [core.angles_at(part, p[None])[0] for part, p in zip(nearest, pts)]
+    assert np.allclose(core.angles_at(geom, pts), expected)
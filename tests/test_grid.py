@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from shapely import vectorized
+
+from shapelib import core
+from shapelib.grid import Grid
+
+
+def test_rasterize2_deprecated():
+    grid = Grid(0, 0, 4, 4, stepx=1, stepy=1)
+    geom = core.rect_poly(1, 1, 3, 3)
+    with pytest.warns(DeprecationWarning):
+        out = grid.rasterize2(geom)
+    assert (out == grid.rasterize(geom)).all()
+
+
+def test_rasterize_non_square_offset():
+    geom = core.circle(3.3, -1.2, 1.7)
+    grid = Grid(1.05, -3.4, 6.2, 1.1, stepx=0.13, stepy=0.31)
+    out = grid.rasterize(geom)
+    assert out.shape == (len(grid.ys), len(grid.xs))
+    xs, ys = np.meshgrid(grid.xs + grid.stepx / 2, grid.ys + grid.stepy / 2)
+    assert (out.astype(bool) == vectorized.contains(geom, xs, ys)).all()
+    # a sequence of geometries is merged
+    merged = grid.rasterize([geom, core.rect_poly(5, 0, 6, 1)])
+    assert merged.sum() > out.sum() and (merged >= out).all()
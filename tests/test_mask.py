@@ -0,0 +1,64 @@
+import operator
+
+import numpy as np
+import pytest
+
+from shapelib import PackedMask, RLEMask
+
+
+def _dense(shape, seed):
+    rs = np.random.RandomState(seed)
+    # runs of various lengths, including full and empty rows
+    array = (rs.uniform(size=shape) < 0.5).astype(np.uint8)
+    array[:, :5] = 1
+    array[1] = 1
+    array[2] = 0
+    return array
+
+
+@pytest.mark.parametrize("cols", [1, 8, 21])
+def test_conversions(cols):
+    dense = _dense((7, cols), 0)
+    rle = RLEMask.from_dense(dense)
+    packed = PackedMask.from_dense(dense)
+    assert (rle.to_dense() == dense).all() and (packed.to_dense() == dense).all()
+    assert rle.count() == packed.count() == dense.sum()
+    assert (rle.to_packed().bits == packed.bits).all()
+    for band_rows in (1, 3, 256):
+        converted = packed.to_rle(band_rows=band_rows)
+        assert (converted.indptr == rle.indptr).all()
+        assert (converted.starts == rle.starts).all()
+        assert (converted.lengths == rle.lengths).all()
+    rows, starts, ends = rle.spans()
+    assert (PackedMask.from_spans(dense.shape, rows, starts, ends).bits == packed.bits).all()
+    # runs are never adjacent
+    same = rows[1:] == rows[:-1]
+    assert (starts[1:][same] > ends[:-1][same]).all()
+
+
+@pytest.mark.parametrize("cls", [RLEMask, PackedMask])
+@pytest.mark.parametrize("op", [operator.and_, operator.or_, operator.xor])
+def test_binary_operators(cls, op):
+    a, b = _dense((9, 21), 1), _dense((9, 21), 2)
+    out = op(cls.from_dense(a), cls.from_dense(b))
+    assert isinstance(out, cls)
+    assert (out.to_dense() == op(a, b)).all()
+    assert out.count() == op(a, b).sum()
+
+
+@pytest.mark.parametrize("cls", [RLEMask, PackedMask])
+def test_invert(cls):
+    dense = _dense((9, 21), 3)
+    inverted = ~cls.from_dense(dense)
+    assert (inverted.to_dense() == 1 - dense).all()
+    assert inverted.count() == dense.size - dense.sum()
+    assert (~inverted).count() == dense.sum()
+
+
+@pytest.mark.parametrize("cls", [RLEMask, PackedMask])
+def test_operators_check_shapes(cls):
+    a, b = cls.from_dense(np.ones((2, 3))), cls.from_dense(np.ones((3, 2)))
+    with pytest.raises(ValueError):
+        a & b
+    with pytest.raises(TypeError):
+        a | np.ones((2, 3))
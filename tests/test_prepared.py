@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from shapely.geometry import LineString, MultiLineString, MultiPolygon, Point, Polygon
+
+from shapelib import core, PreparedShape
+
+
+def _geometries():
+    return [
+        Polygon([(0, 0), (10, 0), (12, 6), (6, 9), (-1, 5)], [[(3, 3), (6, 3), (5, 5)]]),
+        MultiPolygon([core.circle(0, 0, 1), core.circle(5, 0, 1)]),
+        LineString([(0, 0), (3, 1), (4, 5), (1, 7)]),
+        MultiLineString([[(0, 0), (3, 1)], [(5, 5), (8, 2), (9, 6)]]),
+    ]
+
+
+def _points(n=40, seed=1):
+    return np.random.RandomState(seed).uniform(-3, 12, size=(n, 2))
+
+
+@pytest.mark.parametrize("geom", _geometries(), ids=lambda g: g.geom_type)
+def test_prepared_matches_core(geom):
+    prepared = PreparedShape(geom)
+    for p in map(tuple, _points()):
+        assert np.isclose(prepared.angle_at(p), core.angle_at(geom, p))
+        assert prepared.nearest_point(p).equals(core.nearest_point(geom, p))
+        assert prepared.contains(p) == geom.contains(Point(p))
+        assert np.isclose(prepared.line_angle_at(p), core.line_angle_at(geom, p))
+        assert np.allclose(prepared.perpendicular_at(p, 2).coords,
+                           core.perpendicular_at(geom, p, 2).coords)
+
+
+def test_prepared_multipolygon_angle():
+    geom = MultiPolygon([core.circle(0, 0, 1), core.circle(5, 0, 1)])
+    assert np.isclose(PreparedShape(geom).angle_at((5, 1.5)), core.angle_at(geom, (5, 1.5)))
+
+
+def test_prepared_strtree():
+    geom = core.circle(0, 0, 1, resolution=128)
+    prepared = PreparedShape(geom)
+    assert len(prepared.segments) > prepared.mintreesize
+    for p in map(tuple, _points()):
+        assert prepared.nearest_point(p).equals_exact(core.nearest_point(geom, p), 1e-9)
@@ -0,0 +1,335 @@
+import logging
+import os
+
+import numpy as np
+import pytest
+from shapely.geometry import (
+    Polygon, GeometryCollection, MultiPolygon, LineString, Point
+)
+
+from shapelib import core, raster, util, Scene, GeometryArray
+
+
+def test_lod_logs_removed_vertices(caplog):
+    geom = core.circle(0, 0, 1, resolution=64)
+    with caplog.at_level(logging.DEBUG, logger='shapelib.raster'):
+        raster.rasterize(geom, 10, backend='numpy')
+    messages = [r.getMessage() for r in caplog.records if r.name == 'shapelib.raster']
+    assert any(m.startswith("lod: removed") for m in messages)
+
+
+
+def test_rasterize_logs_backend(caplog, capsys):
+    with caplog.at_level(logging.DEBUG, logger='shapelib.raster'):
+        raster.rasterize(core.circle(0, 0, 1), 10, backend='numpy')
+    assert capsys.readouterr().out == ''
+    assert "using backend: numpy" in [r.getMessage() for r in caplog.records]
+
+def test_distance_field_default_band():
+    geom = core.circle(0, 0, 5)
+    bounded = raster.distance_field(geom, 10)
+    full = raster.distance_field(geom, 10, max_distance=np.inf)
+    assert np.abs(bounded).max() <= raster._DISTANCE_BAND / 10 + 1e-6
+    inband = np.abs(full) < raster._DISTANCE_BAND / 10
+    assert np.allclose(bounded[inband], full[inband], atol=1e-5)
+
+
+
+def test_distance_field_matches_shapely():
+    geom = MultiPolygon([core.circle(0, 0, 3), core.ring(8, 2, 3, 1),
+                         core.rect_poly(-2, -6, 12, -5)])
+    pixratio = 7
+    bounded = raster.distance_field(geom, pixratio)
+    full = raster.distance_field(geom, pixratio, max_distance=np.inf)
+    x0, y0, _, _ = geom.bounds
+    rows, cols = full.shape
+    rs = np.random.RandomState(0)
+    for i, j in zip(rs.randint(0, rows, 200), rs.randint(0, cols, 200)):
+        p = Point(x0 + (j + 0.5) / pixratio, y0 + (rows - i - 0.5) / pixratio)
+        d = geom.boundary.distance(p)
+        assert abs(abs(full[i, j]) - d) < 1e-5
+        assert abs(abs(bounded[i, j]) - min(d, raster._DISTANCE_BAND / pixratio)) < 1e-5
+
+def _scene():
+    return Scene([core.circle(0, 0, 1), core.circle(5, 3, 1)])
+
+
+def test_scene_empty_window():
+    scene = _scene()
+    ranges = dict(xrange=(100, 110), yrange=(0, 1))
+    out = raster.rasterize(scene, 10, **ranges).array
+    assert out.shape == (10, 100) and not out.any()
+    for func in (raster.rasterize_tiled, raster.iter_rasterize, raster.rasterize_coverage):
+        result = func(scene, 10, **ranges)
+        arrays = [band for _, band in result] if func is raster.iter_rasterize else [result.array]
+        assert not any(a.any() for a in arrays)
+
+
+def test_scene_extent_from_bounds():
+    scene = _scene()
+    # the y extent is that of the scene, not of the selected geometries
+    assert raster.rasterize(scene, 10, xrange=(-1, 1)).array.shape == (50, 20)
+    dense = raster.rasterize(scene, 10, backend='numpy').array
+    assert (raster.rasterize_tiled(scene, 10, tilesize=16).array == dense).all()
+
+
+def test_scene_bounds_all_empty():
+    assert Scene([Polygon()]).bounds == ()
+    out = raster.rasterize(Scene([Polygon()]), 10, xrange=(0, 1), yrange=(0, 1))
+    assert out.array.shape == (10, 10) and not out.array.any()
+
+
+def test_iter_rasterize_bands():
+    geom = GeometryCollection([core.circle(0, 0, 1), core.ring(5, 3, 2, 0.5),
+                               core.circle(1, 4, 1.5)])
+    dense = raster.rasterize(geom, 10, backend='numpy', lod=False).array
+    for band_rows in (1, 7, 256):
+        bands = [band.copy() for _, band in
+                 raster.iter_rasterize(geom, 10, band_rows=band_rows, lod=False)]
+        assert (np.concatenate(bands) == dense).all()
+
+
+def _garray():
+    return GeometryArray.from_shapely([
+        MultiPolygon([core.circle(0, 0, 1), core.circle(3, 0, 1)]),
+        core.ring(5, 3, 2, 0.5),
+        LineString([(0, 3), (3, 5)]),
+        Point(2, 2),
+        Polygon(),
+    ])
+
+
+def test_geometryarray_rasterizers():
+    garray = _garray()
+    geom = garray.to_shapely()
+    dense = raster.rasterize(geom, 10, backend='numpy', lod=False).array
+    assert (raster.rasterize(garray, 10, backend='numpy').array == dense).all()
+    for lod in (True, False):
+        tiled = raster.rasterize_tiled(garray, 10, tilesize=16, lod=lod).array
+        assert (tiled == dense).all()
+    assert (raster.rasterize_parallel(garray, 10, tilesize=32, workers=2).array == dense).all()
+    bands = [band.copy() for _, band in raster.iter_rasterize(garray, 10, band_rows=7)]
+    assert (np.concatenate(bands) == dense).all()
+    assert np.allclose(raster.rasterize_coverage(garray, 10).array,
+                       raster.rasterize_coverage(geom, 10).array)
+    assert np.allclose(raster.distance_field(garray, 10), raster.distance_field(geom, 10))
+
+
+def test_geometryarray_rasterize_many():
+    garray = _garray()
+    values = np.arange(1, len(garray) + 1)
+    for merge in ('last', 'max', 'sum'):
+        expected = raster.rasterize_many(list(garray), values, 10, merge=merge).array
+        assert (raster.rasterize_many(garray, values, 10, merge=merge).array == expected).all()
+
+
+def test_geometryarray_empty():
+    garray = GeometryArray.from_shapely([])
+    ranges = dict(xrange=(0, 1), yrange=(0, 1))
+    for func in (raster.rasterize, raster.rasterize_tiled, raster.rasterize_coverage):
+        out = func(garray, 10, **ranges).array
+        assert out.shape == (10, 10) and not out.any()
+    assert raster.distance_field(garray, 10, **ranges).shape == (10, 10)
+    with pytest.raises(ValueError):
+        raster.rasterize(garray, 10)
+
+
+def _geometry():
+    outer = [(0.13, 0.07), (10.3, 0.41), (12.2, 6.17), (6.05, 9.3), (-1.1, 5.23)]
+    return MultiPolygon([Polygon(outer, [[(3.1, 3.3), (6.2, 3.05), (5.3, 5.1)]]),
+                         core.circle(15.3, 4.1, 2.2)])
+
+
+def test_scanline_matches_contains():
+    from shapely import vectorized
+    geom = _geometry()
+    pixratio = 7.3
+    x0, y0, x1, y1 = geom.bounds
+    rows, cols = raster._rastershape(x0, y0, x1, y1, pixratio)
+    edges, groups = raster._pixel_edges(geom, pixratio, x0, y0, rows)
+    mask = np.empty((rows, cols), dtype=np.uint8)
+    raster._fill_spans(mask, *raster._scanline_spans(edges, groups, 0, rows, 0, cols))
+    # the centers of the pixels, row 0 at the top
+    xs = x0 + (np.arange(cols) + 0.5) / pixratio
+    ys = y0 + (rows - np.arange(rows) - 0.5) / pixratio
+    inside = vectorized.contains(geom, *np.meshgrid(xs, ys))
+    # pixel centers lying on an edge can go either way
+    assert np.count_nonzero(mask.astype(bool) != inside) <= 2
+
+
+def test_outputs_match_dense():
+    geom = _geometry()
+    dense = raster.rasterize(geom, 9, backend='numpy').array
+    assert (raster.rasterize_tiled(geom, 9, tilesize=16).array == dense).all()
+    assert (raster.rasterize_parallel(geom, 9, tilesize=32, workers=2).array == dense).all()
+    bands = [band.copy() for _, band in raster.iter_rasterize(geom, 9, band_rows=10)]
+    assert (np.concatenate(bands) == dense).all()
+    for output in ('packed', 'rle'):
+        mask = raster.rasterize(geom, 9, output=output).array
+        assert (mask.to_dense() == dense).all()
+
+
+def test_lod_skips_sparse_geometries():
+    # 65 vertices along a perimeter of 50 pixels: nothing below half a pixel
+    geom = MultiPolygon([core.circle(x, 0, 0.4) for x in range(0, 100, 2)])
+    lod = util.geom_lod(geom, 20)
+    assert lod.geom is geom and lod.removed == 0
+    default = raster.rasterize(geom, 20, backend='numpy').array
+    assert (default == raster.rasterize(geom, 20, backend='numpy', lod=False).array).all()
+
+
+def test_lod_simplifies_dense_geometries():
+    geom = core.circle(0, 0, 1, resolution=64)
+    lod = util.geom_lod(geom, 10)
+    assert lod.removed > 0
+    assert lod.removed == util.geom_numcoords(geom) - util.geom_numcoords(lod.geom)
+
+
+def _full(rasterizer):
+    x0, y0, x1, y1 = rasterizer.bounds
+    geom = GeometryCollection([g for g in rasterizer.geoms if not g.is_empty])
+    return raster.rasterize(geom, rasterizer.pixratio, xrange=(x0, x1), yrange=(y0, y1),
+                            backend='numpy', lod=False).array
+
+
+def test_rasterizer_update_matches_full():
+    a, b = core.circle(2, 2, 1.5), core.rect_poly(4, 0, 9, 3)
+    r = raster.Rasterizer([a, b, core.circle(7, 5, 1)], 10)
+    assert (r.array == _full(r)).all()
+    moved = core.circle(3, 2.5, 1.5)
+    win = r.update(a, moved)
+    assert (r.array == _full(r)).all()
+    assert win.row1 > win.row0 and win.col1 > win.col0
+    r.update(b, None)
+    assert (r.array == _full(r)).all()
+    r.update(None, core.ring(6, 4, 1.5, 0.5))
+    assert (r.array == _full(r)).all()
+
+
+def test_rasterizer_empty_geometries():
+    r = raster.Rasterizer([Polygon(), core.rect_poly(0, 0, 1, 1)], 10)
+    assert r.array.shape == (10, 10) and r.array.all()
+    assert r.update(None, Polygon()) == (0, 0, 0, 0)
+    r.update(r.geoms[1], core.circle(0, 0, 0))
+    assert not r.array.any()
+    assert len(r.geoms) == 3
+
+
+def test_raster_cache_put_leaves_no_temporary_files(tmp_path):
+    cache = raster.RasterCache(str(tmp_path))
+    array = np.arange(12, dtype=np.uint8).reshape(3, 4)
+    cache.put('a', array)
+    cache.put('a', array + 1)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['a.npy']
+    assert (cache.get('a') == array + 1).all()
+
+
+@pytest.mark.parametrize("values, fill, merge, expected", [
+    ([1, 200], 0, 'last', np.uint8),
+    ([100, 200], 0, 'last', np.uint8),
+    ([100, 200], 0, 'sum', np.uint16),
+    ([-1, 100], 0, 'max', np.int8),
+    ([100, 100], -100, 'sum', np.int8),
+    ([1, 2], -200, 'min', np.int16),
+    ([True, False], 0, 'last', np.uint8),
+    ([1, 2], 0.5, 'last', np.float32),
+    ([0.5, 1e10], 0, 'last', np.float32),
+    ([0.1], 0, 'last', np.float64),
+])
+def test_smallest_dtype(values, fill, merge, expected):
+    assert raster._smallest_dtype(np.array(values), fill, merge) == expected
+
+def test_smallest_dtype_nan_fill():
+    assert raster._smallest_dtype(np.array([1.5, 2.0]), np.nan, 'last') == np.float32
+    assert raster._smallest_dtype(np.array([1, 2]), np.nan, 'sum') == np.float32
+    assert raster._smallest_dtype(np.array([0.1]), np.nan, 'max') == np.float64
+    out = raster.rasterize_many([core.circle(0, 0, 1)], [2], 10, fill=np.nan).array
+    assert out.dtype == np.float32 and np.isnan(out).any() and (out == 2).any()
+
+
+def test_matplotlib_backend_matches_numpy(tmp_path):
+    pytest.importorskip('matplotlib')
+    geom = _geometry()
+    out = raster.rasterize(geom, 9, backend='matplotlib', lod=False,
+                           imageout=str(tmp_path / 'out.png'))
+    dense = raster.rasterize(geom, 9, backend='numpy', lod=False).array
+    assert out.array.shape == dense.shape and out.array.dtype == np.uint8
+    # Agg samples the pixels differently, they only disagree along the edges
+    distance = raster.distance_field(geom, 9) * 9
+    assert (np.abs(distance[out.array != dense]) < 1).all()
+    assert (tmp_path / 'out.png').exists()
+
+
+def test_coverage_matches_intersection_area():
+    from shapely.geometry import box
+    from shapely.ops import unary_union
+    # the overlapping polygons of a collection are merged
+    geom = GeometryCollection(list(_geometry().geoms) + [core.circle(13, 5, 1.5)])
+    merged = unary_union(list(geom.geoms))
+    pixratio = 4
+    coverage = raster.rasterize_coverage(geom, pixratio).array
+    x0, y0, _, _ = geom.bounds
+    rows, cols = coverage.shape
+    size = 1 / pixratio
+    for i in range(rows):
+        for j in range(cols):
+            x, y = x0 + j * size, y0 + (rows - i - 1) * size
+            area = box(x, y, x + size, y + size).intersection(merged).area
+            assert abs(coverage[i, j] - area / size ** 2) < 1e-4
+
+
+def test_pyramid_is_lazy():
+    pyramid = raster.rasterize_pyramid(_geometry(), 9, 4, backend='numpy')
+    assert pyramid._levels == [None] * 4
+    pyramid[2]
+    assert [level is None for level in pyramid._levels] == [False, False, False, True]
+    assert pyramid[-1] is pyramid[3]
+    with pytest.raises(IndexError):
+        pyramid[4]
+    with pytest.raises(ValueError):
+        raster.rasterize_pyramid(_geometry(), 9, 4, reduce='median')
+
+
+@pytest.mark.parametrize("reduce", ['any', 'all', 'mean'])
+def test_pyramid_reductions(reduce):
+    pyramid = raster.rasterize_pyramid(_geometry(), 9, 3, reduce=reduce, backend='numpy')
+    base = raster.rasterize(_geometry(), 9, backend='numpy').array.astype(np.float64)
+    assert pyramid[0].dtype == (np.float32 if reduce == 'mean' else np.uint8)
+    for level in (1, 2):
+        size = 2 ** level
+        rows, cols = base.shape
+        # the raster is padded with empty pixels to a multiple of the block
+        padded = np.zeros((-(-rows // size) * size, -(-cols // size) * size))
+        padded[:rows, :cols] = base
+        blocks = padded.reshape(padded.shape[0] // size, size, padded.shape[1] // size, size)
+        expected = {'any': blocks.max(axis=(1, 3)), 'all': blocks.min(axis=(1, 3)),
+                    'mean': blocks.mean(axis=(1, 3))}[reduce]
+        assert pyramid[level].shape == expected.shape
+        assert np.allclose(pyramid[level], expected)
+
+
+def test_raster_cache_hits_and_misses(tmp_path):
+    cache = raster.RasterCache(str(tmp_path))
+    geom = core.circle(0, 0, 1)
+    first = raster.rasterize(geom, 10, cache=cache).array
+    again = raster.rasterize(geom, 10, cache=cache).array
+    assert (first == again).all() and not again.flags.writeable
+    raster.rasterize(geom, 20, cache=cache)
+    stats = cache.stats
+    assert (stats.hits, stats.misses, stats.numfiles) == (1, 2, 2)
+    cache.clear()
+    assert tuple(cache.stats) == (0, 0, 0, 0)
+
+
+def test_raster_cache_evicts_least_recently_used(tmp_path):
+    array = np.zeros(1000, dtype=np.uint8)
+    cache = raster.RasterCache(str(tmp_path), maxsize=10 ** 6)
+    for t, key in enumerate('abc'):
+        cache.put(key, array)
+        os.utime(str(tmp_path / (key + '.npy')), (t, t))
+    cache.get('a')
+    # room for two entries: 'b' was used least recently
+    cache.maxsize = 2 * os.path.getsize(str(tmp_path / 'a.npy'))
+    cache.evict()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['a.npy', 'c.npy']
+    assert cache.get('b') is None
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from shapely.geometry import Point, Polygon
+
+from shapelib import core, Scene
+
+
+def _geoms(n=60, seed=0):
+    rs = np.random.RandomState(seed)
+    xs, ys, radii = rs.uniform(0, 50, n), rs.uniform(0, 20, n), rs.uniform(0.2, 2, n)
+    return [core.circle(x, y, r) for x, y, r in zip(xs, ys, radii)]
+
+
+def _windows(seed=1):
+    rs = np.random.RandomState(seed)
+    for x, y, w, h in rs.uniform([-5, -5, 0, 0], [50, 20, 15, 8], size=(30, 4)):
+        yield x, y, x + w, y + h
+
+
+def _check(scene):
+    for x0, y0, x1, y1 in _windows():
+        expected = sorted(k for k in scene.keys() if not scene[k].is_empty
+                          and scene[k].bounds[0] <= x1 and scene[k].bounds[2] >= x0
+                          and scene[k].bounds[1] <= y1 and scene[k].bounds[3] >= y0)
+        assert scene.query((x0, y0, x1, y1)).tolist() == expected
+    pts = np.random.RandomState(2).uniform([-5, -5], [55, 25], size=(30, 2))
+    for p, key in zip(pts, scene.nearest(pts)):
+        dist = min(g.distance(Point(p)) for g in scene if not g.is_empty)
+        assert scene[key].distance(Point(p)) == pytest.approx(dist)
+
+
+@pytest.mark.parametrize("minchanges", [0, 1000])
+def test_scene_query_nearest_remove(minchanges):
+    scene = Scene(_geoms())
+    # with minchanges=1000 the changes stay pending, with 0 the index is rebuilt
+    scene.minchanges = minchanges
+    _check(scene)
+    for key in scene.keys()[::3]:
+        scene.remove(key)
+    new = [scene.insert(g) for g in _geoms(20, seed=5)]
+    scene.remove(new[0])
+    scene.insert(Polygon())
+    assert len(scene) == 60 - 20 + 20 - 1 + 1
+    _check(scene)
+    with pytest.raises(KeyError):
+        scene.remove(new[0])
+
+
+def test_scene_nearest_empty():
+    with pytest.raises(ValueError):
+        Scene().nearest([(0, 0)])